@@ -2,22 +2,25 @@
 账户与持仓 API 路由
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
-from typing import Optional, List, Dict, Any
-from datetime import date, datetime, timedelta
-from decimal import Decimal
+from typing import Dict, Any, Iterator
+from datetime import datetime, timedelta
+from itertools import chain
 import logging
 
-from database.connection import SessionLocal
-from database.models import User, Position, Trade, StockPrice
+import orjson
+
+from database.connection import get_db
 from repositories.user_repo import (
-    get_user, user_has_password, set_user_password, verify_user_password,
+    get_user, get_user_with_password_flag, user_has_password, set_user_password, verify_user_password,
     create_auth_session, verify_auth_session, revoke_auth_session, revoke_all_user_sessions
 )
-from repositories.position_repo import list_positions
+from repositories.position_repo import list_position_rows
 from services.asset_calculator import calc_positions_value
+from services.asset_curve import load_asset_curve
+from services.cache import overview_cache
 from schemas.user import PasswordSetRequest, PasswordVerifyRequest, AuthSessionResponse, AuthVerifyRequest, AuthLoginRequest
 
 logger = logging.getLogger(__name__)
@@ -25,34 +28,49 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/account", tags=["account"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _json_response(content: bytes) -> Response:
+    """已编码的 JSON 直接作为响应体，跳过 jsonable_encoder"""
+    return Response(content=content, media_type="application/json")
+
+
+def _curve_response(request: Request, points: Iterator[Dict[str, Any]]) -> Response:
+    """按 Accept 头返回 NDJSON 流或完整 JSON 数组，均用 orjson 序列化"""
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            (orjson.dumps(point) + b"\n" for point in points),
+            media_type="application/x-ndjson",
+        )
+    return Response(content=orjson.dumps(list(points)), media_type="application/json")
 
 
 @router.get("/overview")
-async def get_overview(user_id: int, db: Session = Depends(get_db)):
+def get_overview(user_id: int, db: Session = Depends(get_db)):
     """获取账户资金概览"""
     try:
-        user = get_user(db, user_id)
+        # 缓存编码后的响应体，命中时不再序列化
+        cached = overview_cache.get(user_id)
+        if cached is not None:
+            return _json_response(cached)
+        
+        user, has_password = get_user_with_password_flag(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="用户不存在")
         positions_value = calc_positions_value(db, user_id)
-        return {
+        overview = {
             "user": {
                 "id": user.id,
                 "username": user.username,
                 "initial_capital": float(user.initial_capital),
                 "current_cash": float(user.current_cash),
                 "frozen_cash": float(user.frozen_cash),
-                "has_password": user_has_password(db, user_id),
+                "has_password": has_password,
             },
             "total_assets": positions_value + float(user.current_cash),
             "positions_value": positions_value,
         }
+        content = orjson.dumps(overview)
+        overview_cache.set(user_id, content)
+        return _json_response(content)
     except HTTPException:
         raise
     except Exception as e:
@@ -61,26 +79,13 @@ async def get_overview(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/positions")
-async def get_positions(user_id: int, db: Session = Depends(get_db)):
+def get_positions(user_id: int, db: Session = Depends(get_db)):
     """获取用户持仓列表"""
     try:
         user = get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="用户不存在")
-        positions = list_positions(db, user_id)
-        return [
-            {
-                "id": p.id,
-                "user_id": p.user_id,
-                "symbol": p.symbol,
-                "name": p.name,
-                "market": p.market,
-                "quantity": p.quantity,
-                "available_quantity": p.available_quantity,
-                "avg_cost": float(p.avg_cost),
-            }
-            for p in positions
-        ]
+        return _json_response(orjson.dumps(list_position_rows(db, user_id)))
     except HTTPException:
         raise
     except Exception as e:
@@ -89,106 +94,38 @@ async def get_positions(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/asset-curve")
-async def get_asset_curve(user_id: int, db: Session = Depends(get_db)):
-    """获取用户资产曲线数据"""
+def get_asset_curve(request: Request, user_id: int, db: Session = Depends(get_db)):
+    """获取用户资产曲线数据，请求头 Accept 为 application/x-ndjson 时按行流式返回"""
     try:
         user = get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="用户不存在")
         
-        # 获取第一笔成交时间
-        first_trade = db.query(Trade).filter(Trade.user_id == user_id).order_by(Trade.trade_time.asc()).first()
+        curve = load_asset_curve(db, user_id, float(user.initial_capital))
         
-        if not first_trade:
+        if curve is None:
             # 如果没有成交记录，返回初始资金点
-            return [{
+            return _curve_response(request, iter([{
                 "date": datetime.now().date().isoformat(),
                 "total_assets": float(user.initial_capital),
                 "cash": float(user.current_cash),
                 "positions_value": 0.0,
                 "is_initial": True
-            }]
+            }]))
         
         # 第一个点：第一笔成交前一天，值为初始资金
-        first_trade_date = first_trade.trade_time.date()
-        start_date = first_trade_date - timedelta(days=1)
-        
-        curve_data = []
-        
-        # 添加起始点
-        curve_data.append({
-            "date": start_date.isoformat(),
-            "total_assets": float(user.initial_capital),
-            "cash": float(user.initial_capital),
+        first_trade_date, curve_points = curve
+        initial_capital = float(user.initial_capital)
+        start_point = {
+            "date": (first_trade_date - timedelta(days=1)).isoformat(),
+            "total_assets": initial_capital,
+            "cash": initial_capital,
             "positions_value": 0.0,
             "is_initial": True
-        })
-        
-        # 获取所有交易日期（有成交的日期）
-        trade_dates = db.query(func.date(Trade.trade_time).label('trade_date')).filter(
-            Trade.user_id == user_id
-        ).distinct().order_by('trade_date').all()
-        
-        # 获取所有有价格数据的日期
-        price_dates = db.query(StockPrice.price_date).distinct().order_by(StockPrice.price_date).all()
-        
-        # 合并并去重所有相关日期
-        all_dates = set()
-        for td in trade_dates:
-            # 处理不同类型的日期对象
-            if hasattr(td, 'trade_date'):
-                trade_date = td.trade_date
-            else:
-                trade_date = td[0]  # 当使用label时，结果是元组
-            
-            if isinstance(trade_date, str):
-                trade_date = datetime.strptime(trade_date, '%Y-%m-%d').date()
-            elif hasattr(trade_date, 'date'):
-                trade_date = trade_date.date()
-            
-            all_dates.add(trade_date)
-            
-        for pd in price_dates:
-            # 处理价格日期
-            if hasattr(pd, 'price_date'):
-                price_date = pd.price_date
-            else:
-                price_date = pd[0]
-                
-            if isinstance(price_date, str):
-                price_date = datetime.strptime(price_date, '%Y-%m-%d').date()
-            elif hasattr(price_date, 'date'):
-                price_date = price_date.date()
-                
-            all_dates.add(price_date)
-        
-        # 过滤出第一笔成交日期之后的日期
-        relevant_dates = sorted([d for d in all_dates if d >= first_trade_date])
-        
-        for target_date in relevant_dates:
-            try:
-                # 计算到该日期为止的现金变化
-                cash_changes = _calculate_cash_changes_up_to_date(db, user_id, target_date)
-                current_cash = float(user.initial_capital) + cash_changes
-                
-                # 计算该日期的持仓价值
-                positions_value = _calculate_positions_value_on_date(db, user_id, target_date)
-                
-                total_assets = current_cash + positions_value
-                
-                curve_data.append({
-                    "date": target_date.isoformat(),
-                    "total_assets": total_assets,
-                    "cash": current_cash,
-                    "positions_value": positions_value,
-                    "is_initial": False
-                })
-                
-            except Exception as e:
-                logger.warning(f"计算日期 {target_date} 的资产失败: {e}")
-                continue
+        }
         
-        return curve_data
+        points = chain([start_point], curve_points)
+        return _curve_response(request, points)
         
     except HTTPException:
         raise
@@ -197,68 +134,8 @@ async def get_asset_curve(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"获取资产曲线失败: {str(e)}")
 
 
-def _calculate_cash_changes_up_to_date(db: Session, user_id: int, target_date: date) -> float:
-    """计算到指定日期为止的现金变化（买入为负，卖出为正）"""
-    trades = db.query(Trade).filter(
-        Trade.user_id == user_id,
-        func.date(Trade.trade_time) <= target_date
-    ).all()
-    
-    cash_change = 0.0
-    for trade in trades:
-        trade_amount = float(trade.price) * trade.quantity + float(trade.commission)
-        if trade.side == "BUY":
-            cash_change -= trade_amount  # 买入减少现金
-        else:  # SELL
-            cash_change += trade_amount  # 卖出增加现金
-    
-    return cash_change
-
-
-def _calculate_positions_value_on_date(db: Session, user_id: int, target_date: date) -> float:
-    """计算指定日期的持仓价值"""
-    # 获取到该日期为止的所有交易，计算每个股票的持仓数量
-    trades = db.query(Trade).filter(
-        Trade.user_id == user_id,
-        func.date(Trade.trade_time) <= target_date
-    ).order_by(Trade.trade_time.asc()).all()
-    
-    # 统计每个股票的净持仓
-    position_quantities = {}
-    for trade in trades:
-        key = f"{trade.symbol}.{trade.market}"
-        if key not in position_quantities:
-            position_quantities[key] = {"symbol": trade.symbol, "market": trade.market, "quantity": 0}
-        
-        if trade.side == "BUY":
-            position_quantities[key]["quantity"] += trade.quantity
-        else:  # SELL
-            position_quantities[key]["quantity"] -= trade.quantity
-    
-    # 计算持仓价值
-    total_value = 0.0
-    for pos_info in position_quantities.values():
-        if pos_info["quantity"] <= 0:
-            continue
-            
-        # 获取该日期的股票价格
-        stock_price = db.query(StockPrice).filter(
-            StockPrice.symbol == pos_info["symbol"],
-            StockPrice.market == pos_info["market"],
-            StockPrice.price_date <= target_date
-        ).order_by(StockPrice.price_date.desc()).first()
-        
-        if stock_price:
-            position_value = float(stock_price.price) * pos_info["quantity"]
-            total_value += position_value
-        else:
-            logger.warning(f"未找到 {pos_info['symbol']} 在 {target_date} 的价格数据")
-    
-    return total_value
-
-
 @router.post("/password/set")
-async def set_password(user_id: int, request: PasswordSetRequest, db: Session = Depends(get_db)):
+def set_password(user_id: int, request: PasswordSetRequest, db: Session = Depends(get_db)):
     """设置或更新交易密码"""
     try:
         user = get_user(db, user_id)
@@ -271,6 +148,7 @@ async def set_password(user_id: int, request: PasswordSetRequest, db: Session =
         updated_user = set_user_password(db, user_id, request.password)
         if not updated_user:
             raise HTTPException(status_code=500, detail="密码设置失败")
+        overview_cache.pop(user_id)
         
         return {"message": "交易密码设置成功"}
     
@@ -280,7 +158,7 @@ async def set_password(user_id: int, request: PasswordSetRequest, db: Session =
 
 
 @router.post("/password/verify")
-async def verify_password(user_id: int, request: PasswordVerifyRequest, db: Session = Depends(get_db)):
+def verify_password(user_id: int, request: PasswordVerifyRequest, db: Session = Depends(get_db)):
     """验证交易密码"""
     try:
         user = get_user(db, user_id)
@@ -300,7 +178,7 @@ async def verify_password(user_id: int, request: PasswordVerifyRequest, db: Sess
 
 
 @router.post("/auth/login", response_model=AuthSessionResponse)
-async def create_auth_session_endpoint(user_id: int, request: AuthLoginRequest, db: Session = Depends(get_db)):
+def create_auth_session_endpoint(user_id: int, request: AuthLoginRequest, db: Session = Depends(get_db)):
     """创建认证会话（180天有效期）- 写死功能"""
     try:
         user = get_user(db, user_id)
@@ -344,7 +222,7 @@ async def create_auth_session_endpoint(user_id: int, request: AuthLoginRequest,
 
 
 @router.post("/auth/verify")
-async def verify_auth_session_endpoint(request: AuthVerifyRequest, db: Session = Depends(get_db)):
+def verify_auth_session_endpoint(request: AuthVerifyRequest, db: Session = Depends(get_db)):
     """验证认证会话是否有效"""
     try:
         user_id = verify_auth_session(db, request.session_token)
@@ -360,7 +238,7 @@ async def verify_auth_session_endpoint(request: AuthVerifyRequest, db: Session =
 
 
 @router.post("/auth/logout")
-async def logout_auth_session(request: AuthVerifyRequest, db: Session = Depends(get_db)):
+def logout_auth_session(request: AuthVerifyRequest, db: Session = Depends(get_db)):
     """注销认证会话"""
     try:
         success = revoke_auth_session(db, request.session_token)
@@ -376,7 +254,7 @@ async def logout_auth_session(request: AuthVerifyRequest, db: Session = Depends(
 
 
 @router.post("/auth/logout-all")
-async def logout_all_sessions(user_id: int, db: Session = Depends(get_db)):
+def logout_all_sessions(user_id: int, db: Session = Depends(get_db)):
     """注销用户所有认证会话"""
     try:
         user = get_user(db, user_id)
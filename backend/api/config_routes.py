@@ -2,26 +2,49 @@
 系统配置 API 路由
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
+from typing import Annotated, Optional
+import hashlib
 import logging
 
-from database.connection import SessionLocal
+from database.connection import get_db
 from database.models import SystemConfig
+from services.cache import xueqiu_cookie_cache, price_cache, kline_cache
+from services.cookie_helper import get_cookie_instructions, get_required_cookies, validate_cookie_string
+from services.xueqiu_market_data import get_xueqiu_cookie, update_xueqiu_cookie, xueqiu_client
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/config", tags=["config"])
 
+DbSession = Annotated[Session, Depends(get_db)]
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+def _get_cached_cookie(db: Session) -> Optional[str]:
+    """读取数据库中的雪球cookie配置，结果缓存60秒"""
+    def load() -> Optional[str]:
+        return db.execute(
+            select(SystemConfig.value).where(SystemConfig.key == "xueqiu_cookie")
+        ).scalar_one_or_none()
+    return xueqiu_cookie_cache.get_or_set("xueqiu_cookie", load)
+
+
+def _cookie_etag(cookie: Optional[str]) -> str:
+    """根据cookie值生成弱ETag，接口返回内容只取决于cookie"""
+    digest = hashlib.blake2b((cookie or "").encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """客户端缓存仍有效时返回304，否则在响应上设置缓存头"""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, max-age=5"
+    return None
 
 
 class ConfigUpdateRequest(BaseModel):
@@ -31,23 +54,27 @@ class ConfigUpdateRequest(BaseModel):
 
 
 @router.get("/xueqiu-cookie")
-async def get_xueqiu_cookie_api(db: Session = Depends(get_db)):
+def get_xueqiu_cookie_api(request: Request, response: Response, db: DbSession):
     """获取雪球cookie配置"""
     try:
         # 首先尝试从数据库获取
-        config = db.query(SystemConfig).filter(SystemConfig.key == "xueqiu_cookie").first()
-        if config and config.value:
+        db_cookie = _get_cached_cookie(db)
+        if db_cookie:
             # 如果数据库有配置，确保同步到全局变量
-            from services.xueqiu_market_data import update_xueqiu_cookie
-            update_xueqiu_cookie(config.value)
+            update_xueqiu_cookie(db_cookie)
+            not_modified = _not_modified(request, response, _cookie_etag(db_cookie))
+            if not_modified:
+                return not_modified
             return {
                 "has_cookie": True,
-                "value": config.value
+                "value": db_cookie
             }
         else:
             # 如果数据库没有配置，检查全局变量
-            from services.xueqiu_market_data import get_xueqiu_cookie
             cookie_value = get_xueqiu_cookie()
+            not_modified = _not_modified(request, response, _cookie_etag(cookie_value))
+            if not_modified:
+                return not_modified
             return {
                 "has_cookie": cookie_value is not None and cookie_value.strip() != "",
                 "value": cookie_value
@@ -58,13 +85,17 @@ async def get_xueqiu_cookie_api(db: Session = Depends(get_db)):
 
 
 @router.post("/xueqiu-cookie")
-async def update_xueqiu_cookie_api(request: ConfigUpdateRequest, db: Session = Depends(get_db)):
+def update_xueqiu_cookie_api(request: ConfigUpdateRequest, db: DbSession):
     """更新雪球cookie配置"""
     try:
         # 验证cookie长度
         if len(request.value) > 10000:
             raise HTTPException(status_code=400, detail="Cookie字符串太长，请确保长度不超过10000字符")
         
+        # 配置未变化时不写库，也不丢弃行情缓存
+        if not request.description and _get_cached_cookie(db) == request.value:
+            return {"success": True, "message": "雪球cookie配置未变化", "noop": True}
+        
         # 保存到数据库
         config = db.query(SystemConfig).filter(SystemConfig.key == "xueqiu_cookie").first()
         if config:
@@ -80,9 +111,12 @@ async def update_xueqiu_cookie_api(request: ConfigUpdateRequest, db: Session = D
             db.add(config)
         
         db.commit()
+        xueqiu_cookie_cache.pop("xueqiu_cookie")
+        # 数据源凭据变化后，丢弃用旧凭据获取的行情
+        price_cache.clear()
+        kline_cache.clear()
         
         # 更新全局变量
-        from services.xueqiu_market_data import update_xueqiu_cookie
         update_xueqiu_cookie(request.value)
         
         return {"success": True, "message": "雪球cookie配置已更新"}
@@ -95,22 +129,25 @@ async def update_xueqiu_cookie_api(request: ConfigUpdateRequest, db: Session = D
 
 
 @router.get("/check-required")
-async def check_required_configs(db: Session = Depends(get_db)):
+def check_required_configs(request: Request, response: Response, db: DbSession):
     """检查必需的配置是否已设置"""
     try:
         # 首先尝试从数据库获取
-        config = db.query(SystemConfig).filter(SystemConfig.key == "xueqiu_cookie").first()
-        if config and config.value and config.value.strip():
+        db_cookie = _get_cached_cookie(db)
+        if db_cookie and db_cookie.strip():
             # 如果数据库有配置，确保同步到全局变量
-            from services.xueqiu_market_data import update_xueqiu_cookie
-            update_xueqiu_cookie(config.value)
+            update_xueqiu_cookie(db_cookie)
+            cookie_value = db_cookie
             has_xueqiu_cookie = True
         else:
             # 如果数据库没有配置，检查全局变量
-            from services.xueqiu_market_data import get_xueqiu_cookie
             cookie_value = get_xueqiu_cookie()
             has_xueqiu_cookie = cookie_value is not None and cookie_value.strip() != ""
         
+        not_modified = _not_modified(request, response, _cookie_etag(cookie_value))
+        if not_modified:
+            return not_modified
+        
         return {
             "has_required_configs": has_xueqiu_cookie,
             "missing_configs": [] if has_xueqiu_cookie else ["xueqiu_cookie"]
@@ -124,9 +161,6 @@ async def check_required_configs(db: Session = Depends(get_db)):
 async def get_cookie_help():
     """获取Cookie配置帮助信息"""
     try:
-        from services.cookie_helper import get_cookie_instructions, get_required_cookies, validate_cookie_string
-        from services.xueqiu_market_data import get_xueqiu_cookie
-        
         current_cookie = get_xueqiu_cookie()
         validation_result = None
         
@@ -145,12 +179,9 @@ async def get_cookie_help():
 
 
 @router.get("/test-xueqiu")
-async def test_xueqiu_connection():
+def test_xueqiu_connection():
     """测试雪球连接和cookie有效性"""
     try:
-        from services.xueqiu_market_data import get_xueqiu_cookie, xueqiu_client
-        import requests
-        
         # 检查cookie状态
         cookie = get_xueqiu_cookie()
         if not cookie:
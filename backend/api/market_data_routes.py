@@ -4,17 +4,28 @@
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
+import asyncio
 import logging
+import time
+
+import orjson
 
 from services.market_data import get_last_price, get_kline_data, get_market_status
+from services.cache import kline_cache
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/market", tags=["market_data"])
 
 
+def _now_ms() -> int:
+    """当前时间戳（毫秒）"""
+    return int(time.time() * 1000)
+
+
 class PriceResponse(BaseModel):
     """价格响应模型"""
     symbol: str
@@ -70,18 +81,27 @@ async def get_stock_price(symbol: str, market: str = "US"):
     try:
         price = get_last_price(symbol, market)
         
-        import time
         return PriceResponse(
             symbol=symbol,
             market=market,
             price=price,
-            timestamp=int(time.time() * 1000)
+            timestamp=_now_ms()
         )
     except Exception as e:
         logger.error(f"获取股票价格失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取股票价格失败: {str(e)}")
 
 
+async def _fetch_price(symbol: str, market: str) -> Optional[float]:
+    """在线程池中获取单个股票价格，失败时记录日志并返回 None"""
+    try:
+        return await asyncio.to_thread(get_last_price, symbol, market)
+    except Exception as e:
+        logger.warning(f"获取 {symbol} 价格失败: {e}")
+        # 继续处理其他股票，不中断整个请求
+        return None
+
+
 @router.get("/prices", response_model=List[PriceResponse])
 async def get_multiple_prices(symbols: str, market: str = "US"):
     """
@@ -103,24 +123,21 @@ async def get_multiple_prices(symbols: str, market: str = "US"):
         if len(symbol_list) > 20:
             raise HTTPException(status_code=400, detail="最多支持20个股票Symbol")
         
-        results = []
-        import time
-        current_timestamp = int(time.time() * 1000)
-        
-        for symbol in symbol_list:
-            try:
-                price = get_last_price(symbol, market)
-                results.append(PriceResponse(
-                    symbol=symbol,
-                    market=market,
-                    price=price,
-                    timestamp=current_timestamp
-                ))
-            except Exception as e:
-                logger.warning(f"获取 {symbol} 价格失败: {e}")
-                # 继续处理其他股票，不中断整个请求
-                
-        return results
+        current_timestamp = _now_ms()
+        
+        # 并发获取各股票价格，总耗时取决于最慢的一次上游请求
+        prices = await asyncio.gather(*(_fetch_price(symbol, market) for symbol in symbol_list))
+        
+        return [
+            PriceResponse(
+                symbol=symbol,
+                market=market,
+                price=price,
+                timestamp=current_timestamp
+            )
+            for symbol, price in zip(symbol_list, prices)
+            if price is not None
+        ]
     except HTTPException:
         raise
     except Exception as e:
@@ -159,32 +176,41 @@ async def get_stock_kline(
         if count <= 0 or count > 500:
             raise HTTPException(status_code=400, detail="数据条数必须在1-500之间")
         
+        # 缓存编码后的响应体，每次请求构造新的 Response
+        cache_key = (symbol, market, period, count)
+        cached = kline_cache.get(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
+        
         # 获取K线数据
         kline_data = get_kline_data(symbol, market, period, count)
         
-        # 转换数据格式
-        kline_items = []
-        for item in kline_data:
-            kline_items.append(KlineItem(
-                timestamp=item.get('timestamp'),
-                datetime=item.get('datetime').isoformat() if item.get('datetime') else None,
-                open=item.get('open'),
-                high=item.get('high'),
-                low=item.get('low'),
-                close=item.get('close'),
-                volume=item.get('volume'),
-                amount=item.get('amount'),
-                chg=item.get('chg'),
-                percent=item.get('percent')
-            ))
-        
-        return KlineResponse(
-            symbol=symbol,
-            market=market,
-            period=period,
-            count=len(kline_items),
-            data=kline_items
-        )
+        # 直接组装字典并用 orjson 编码（datetime 由 orjson 原生序列化为 ISO 格式），不逐行构造 Pydantic 模型
+        kline_items = [
+            {
+                "timestamp": item.get('timestamp'),
+                "datetime": item.get('datetime') or None,
+                "open": item.get('open'),
+                "high": item.get('high'),
+                "low": item.get('low'),
+                "close": item.get('close'),
+                "volume": item.get('volume'),
+                "amount": item.get('amount'),
+                "chg": item.get('chg'),
+                "percent": item.get('percent'),
+            }
+            for item in kline_data
+        ]
+        
+        content = orjson.dumps({
+            "symbol": symbol,
+            "market": market,
+            "period": period,
+            "count": len(kline_items),
+            "data": kline_items,
+        })
+        kline_cache.set(cache_key, content)
+        return Response(content=content, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -227,14 +253,14 @@ async def market_data_health():
     Returns:
         服务状态信息
     """
+    now_ms = _now_ms()
     try:
         # 测试获取一个价格来检查服务是否正常
         test_price = get_last_price("MSFT", "US")
         
-        import time
         return {
             "status": "healthy",
-            "timestamp": int(time.time() * 1000),
+            "timestamp": now_ms,
             "test_price": {
                 "symbol": "MSFT.US",
                 "price": test_price
@@ -245,7 +271,7 @@ async def market_data_health():
         logger.error(f"市场数据服务健康检查失败: {e}")
         return {
             "status": "unhealthy",
-            "timestamp": int(time.time() * 1000),
+            "timestamp": now_ms,
             "error": str(e),
             "message": "市场数据服务异常"
         }
\ No newline at end of file
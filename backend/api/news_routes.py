@@ -1,5 +1,8 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List, Dict
+from fastapi.responses import JSONResponse
+from typing import Any, Optional, List, Dict, Tuple
+import asyncio
+import orjson
 import sys
 import os
 
@@ -17,7 +20,116 @@ from zhitong import (
     filter_gmteight_stock_news,
 )
 
-router = APIRouter(prefix="/api/news", tags=["news"])
+class _ORJSONResponse(JSONResponse):
+    """用 orjson 编码的 JSON 响应，新闻接口返回的是较大的字典列表"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+router = APIRouter(prefix="/api/news", tags=["news"], default_response_class=_ORJSONResponse)
+
+# 保存K线时并发获取的股票数量与上游请求速率上限
+_KLINE_CONCURRENCY = 8
+_KLINE_RATE_PER_SECOND = 5
+
+
+class _RateLimiter:
+    """异步限速器：相邻两次请求的开始时间间隔不小于 1/rate 秒"""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate
+        self._lock = asyncio.Lock()
+        self._next_time = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_time - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_time = max(loop.time(), self._next_time) + self._interval
+
+
+async def _fetch_kline(i: int, total: int, symbol: str, limiter: _RateLimiter) -> Tuple[Optional[List[Dict]], Dict]:
+    """
+    获取单个股票的日K线，失败时重试一次
+    返回 (K线数据, 状态)，获取成功时状态只记录是否经过重试，保存结果在写库阶段补充
+    """
+    from services.market_data import get_kline_data
+
+    async def fetch():
+        await limiter.wait()
+        # 获取日K线数据，100条
+        return await asyncio.to_thread(get_kline_data, symbol, "US", "1d", 100)
+
+    try:
+        print(f"📈 [{i}/{total}] 正在获取 {symbol} 的日K线数据...")
+        kline_data = await fetch()
+        
+        if kline_data:
+            print(f"✅ [{i}/{total}] {symbol} 获取到 {len(kline_data)} 条日K线数据")
+            return kline_data, {"status": "success"}
+        return None, {
+            "status": "no_data",
+            "message": "未获取到K线数据"
+        }
+            
+    except Exception as e:
+        error_msg = str(e)
+        print(f"❌ [{i}/{total}] {symbol} 获取K线数据失败: {error_msg}")
+        
+        # 尝试重试一次
+        try:
+            print(f"🔄 [{i}/{total}] {symbol} 重试获取K线数据...")
+            await asyncio.sleep(1)  # 等待1秒后重试
+            kline_data = await fetch()
+            if kline_data:
+                print(f"✅ [{i}/{total}] {symbol} 重试成功，获取到 {len(kline_data)} 条数据")
+                return kline_data, {"status": "success_retry", "note": "重试成功"}
+            return None, {
+                "status": "error",
+                "message": f"重试仍失败: {error_msg}"
+            }
+        except Exception as e2:
+            return None, {
+                "status": "error", 
+                "message": f"首次失败: {error_msg}, 重试失败: {str(e2)}"
+            }
+
+
+def _save_klines(fetched: List[Tuple[str, Optional[List[Dict]], Dict]]) -> Dict[str, Dict]:
+    """所有K线获取完成后，用一个会话依次写库（upsert模式），返回各股票的保存状态"""
+    from repositories.kline_repo import KlineRepository
+    from database.connection import SessionFactory
+
+    total = len(fetched)
+    kline_save_status = {}
+    db = SessionFactory()
+    try:
+        kline_repo = KlineRepository(db)
+        for i, (symbol, kline_data, status) in enumerate(fetched, 1):
+            if not kline_data:
+                kline_save_status[symbol] = status
+                continue
+            try:
+                save_result = kline_repo.save_kline_data(symbol, "US", "1d", kline_data)
+            except Exception as e:
+                db.rollback()
+                print(f"❌ [{i}/{total}] {symbol} 保存K线数据失败: {e}")
+                kline_save_status[symbol] = {"status": "error", "message": f"保存失败: {str(e)}"}
+                continue
+            print(f"💾 [{i}/{total}] {symbol} 成功处理 {save_result['total']} 条数据 (新增:{save_result['inserted']}, 更新:{save_result['updated']})")
+            kline_save_status[symbol] = {
+                **status,
+                "inserted_count": save_result['inserted'],
+                "updated_count": save_result['updated'],
+                "total_processed": save_result['total'],
+                "total_count": len(kline_data)
+            }
+    finally:
+        db.close()
+    return kline_save_status
 
 
 @router.get("/us-stock-movement")
@@ -150,14 +262,13 @@ async def get_gmteight_news_api(
         parsed_news = [parse_gmteight_news_item(item) for item in news_list]
         filtered_news = filter_gmteight_stock_news(parsed_news)
 
-        # 提取并去重股票Symbol
-        all_stock_codes = []
-        for news in filtered_news:
-            stock_codes = news.get('stock_codes', [])
-            all_stock_codes.extend(stock_codes)
-        
-        # 去重股票列表，去掉.US后缀用于API调用
-        unique_stocks = list(set([code.replace('.US', '') for code in all_stock_codes if code.endswith('.US')]))
+        # 提取并去重股票Symbol，去掉.US后缀用于API调用（排序保证处理顺序稳定）
+        unique_stocks = sorted({
+            code[:-3]
+            for news in filtered_news
+            for code in news.get('stock_codes', ())
+            if code.endswith('.US')
+        })
         
         kline_save_status = {}
         
@@ -165,85 +276,24 @@ async def get_gmteight_news_api(
         if save_kline and unique_stocks:
             print(f"🔄 开始为 {len(unique_stocks)} 个去重股票获取和保存日K线数据...")
             
-            # 确保雪球cookie已初始化
-            from services.startup import initialize_xueqiu_config
-            initialize_xueqiu_config()
-            
-            from services.market_data import get_kline_data
-            from repositories.kline_repo import KlineRepository
-            from database.connection import get_db
+            # 先并发获取全部K线（最多8个同时进行，整体限速每秒5次请求），不占用数据库连接
+            semaphore = asyncio.Semaphore(_KLINE_CONCURRENCY)
+            limiter = _RateLimiter(_KLINE_RATE_PER_SECOND)
+            total = len(unique_stocks)
             
-            db = next(get_db())
-            kline_repo = KlineRepository(db)
+            async def handle(i: int, symbol: str):
+                async with semaphore:
+                    return await _fetch_kline(i, total, symbol, limiter)
             
-            for i, symbol in enumerate(unique_stocks, 1):
-                try:
-                    print(f"📈 [{i}/{len(unique_stocks)}] 正在获取 {symbol} 的日K线数据...")
-                    # 获取日K线数据，100条
-                    kline_data = get_kline_data(symbol, "US", "1d", 100)
-                    
-                    # 添加短暂延迟避免请求过快  
-                    import time
-                    time.sleep(0.2)  # 增加延迟到200ms
-                    
-                    if kline_data:
-                        print(f"✅ [{i}/{len(unique_stocks)}] {symbol} 获取到 {len(kline_data)} 条日K线数据，正在保存...")
-                        # 保存到数据库（upsert模式）
-                        save_result = kline_repo.save_kline_data(symbol, "US", "1d", kline_data)
-                        inserted = save_result['inserted']
-                        updated = save_result['updated']
-                        total_processed = save_result['total']
-                        
-                        print(f"💾 [{i}/{len(unique_stocks)}] {symbol} 成功处理 {total_processed} 条数据 (新增:{inserted}, 更新:{updated})")
-                        kline_save_status[symbol] = {
-                            "status": "success",
-                            "inserted_count": inserted,
-                            "updated_count": updated,
-                            "total_processed": total_processed,
-                            "total_count": len(kline_data)
-                        }
-                    else:
-                        kline_save_status[symbol] = {
-                            "status": "no_data",
-                            "message": "未获取到K线数据"
-                        }
-                        
-                except Exception as e:
-                    error_msg = str(e)
-                    print(f"❌ [{i}/{len(unique_stocks)}] {symbol} 获取K线数据失败: {error_msg}")
-                    
-                    # 尝试重试一次
-                    try:
-                        print(f"🔄 [{i}/{len(unique_stocks)}] {symbol} 重试获取K线数据...")
-                        time.sleep(1)  # 等待1秒后重试
-                        kline_data = get_kline_data(symbol, "US", "1d", 100)
-                        if kline_data:
-                            print(f"✅ [{i}/{len(unique_stocks)}] {symbol} 重试成功，获取到 {len(kline_data)} 条数据")
-                            save_result = kline_repo.save_kline_data(symbol, "US", "1d", kline_data)
-                            inserted = save_result['inserted']
-                            updated = save_result['updated']
-                            total_processed = save_result['total']
-                            print(f"💾 [{i}/{len(unique_stocks)}] {symbol} 重试处理 {total_processed} 条数据 (新增:{inserted}, 更新:{updated})")
-                            kline_save_status[symbol] = {
-                                "status": "success_retry",
-                                "inserted_count": inserted,
-                                "updated_count": updated,
-                                "total_processed": total_processed,
-                                "total_count": len(kline_data),
-                                "note": "重试成功"
-                            }
-                        else:
-                            kline_save_status[symbol] = {
-                                "status": "error",
-                                "message": f"重试仍失败: {error_msg}"
-                            }
-                    except Exception as e2:
-                        kline_save_status[symbol] = {
-                            "status": "error", 
-                            "message": f"首次失败: {error_msg}, 重试失败: {str(e2)}"
-                        }
+            results = await asyncio.gather(
+                *(handle(i, symbol) for i, symbol in enumerate(unique_stocks, 1))
+            )
             
-            db.close()
+            # 再统一写库，会话只在写入阶段持有
+            kline_save_status = await asyncio.to_thread(
+                _save_klines,
+                [(symbol, kline_data, status) for symbol, (kline_data, status) in zip(unique_stocks, results)],
+            )
 
         return {
             "status": "success",
@@ -252,7 +302,7 @@ async def get_gmteight_news_api(
             "total": len(filtered_news),
             "unique_stocks": unique_stocks,
             "unique_stocks_count": len(unique_stocks),
-            "all_stock_codes": all_stock_codes,
+            "all_stock_codes": [code for news in filtered_news for code in news.get('stock_codes', ())],
             "kline_save_enabled": save_kline,
             "kline_save_status": kline_save_status if save_kline else {}
         }
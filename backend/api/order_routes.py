@@ -1,17 +1,22 @@
 """
 订单管理API路由
 提供委托订单的创建、查询、取消等功能
+端点均为同步数据库操作，定义为普通函数由 FastAPI 放到线程池执行，不阻塞事件循环
 """
 
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 import logging
 
-from database.connection import SessionLocal
+import orjson
+
+from database.connection import get_db
 from database.models import User, Order
 from schemas.order import OrderCreate, OrderOut
+from repositories.order_repo import list_order_rows
 from services.order_matching import create_order, check_and_execute_order, get_pending_orders, cancel_order, process_all_pending_orders
 from repositories.user_repo import verify_user_password, user_has_password, set_user_password, verify_auth_session
 
@@ -20,15 +25,6 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/orders", tags=["orders"])
 
 
-def get_db():
-    """获取数据库会话"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 class OrderCreateRequest(BaseModel):
     """创建订单请求模型"""
     user_id: int
@@ -59,7 +55,7 @@ class OrderProcessingResult(BaseModel):
 
 
 @router.post("/create", response_model=OrderOut)
-async def create_new_order(request: OrderCreateRequest, db: Session = Depends(get_db)):
+def create_new_order(request: OrderCreateRequest, db: Session = Depends(get_db)):
     """
     创建委托订单
     
@@ -133,7 +129,7 @@ async def create_new_order(request: OrderCreateRequest, db: Session = Depends(ge
 
 
 @router.get("/pending", response_model=List[OrderOut])
-async def get_user_pending_orders(user_id: Optional[int] = None, db: Session = Depends(get_db)):
+def get_user_pending_orders(user_id: Optional[int] = None, db: Session = Depends(get_db)):
     """
     获取待成交订单
     
@@ -153,7 +149,7 @@ async def get_user_pending_orders(user_id: Optional[int] = None, db: Session = D
 
 
 @router.get("/user/{user_id}", response_model=List[OrderOut])
-async def get_user_orders(user_id: int, status: Optional[str] = None, db: Session = Depends(get_db)):
+def get_user_orders(user_id: int, status: Optional[str] = None, db: Session = Depends(get_db)):
     """
     获取用户的所有订单
     
@@ -166,13 +162,9 @@ async def get_user_orders(user_id: int, status: Optional[str] = None, db: Sessio
         用户订单列表
     """
     try:
-        query = db.query(Order).filter(Order.user_id == user_id)
-        
-        if status:
-            query = query.filter(Order.status == status)
-        
-        orders = query.order_by(Order.created_at.desc()).all()
-        return orders
+        # 按列查询并直接编码，不构造 ORM 实例，也不经过 response_model 校验
+        orders = list_order_rows(db, user_id, status)
+        return Response(content=orjson.dumps(orders), media_type="application/json")
         
     except Exception as e:
         logger.error(f"获取用户订单失败: {e}")
@@ -180,7 +172,7 @@ async def get_user_orders(user_id: int, status: Optional[str] = None, db: Sessio
 
 
 @router.post("/execute/{order_id}", response_model=OrderExecutionResult)
-async def execute_order_manually(order_id: int, db: Session = Depends(get_db)):
+def execute_order_manually(order_id: int, db: Session = Depends(get_db)):
     """
     手动执行指定订单（检查成交条件）
     
@@ -225,7 +217,7 @@ async def execute_order_manually(order_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/cancel/{order_id}")
-async def cancel_user_order(order_id: int, reason: str = "用户取消", db: Session = Depends(get_db)):
+def cancel_user_order(order_id: int, reason: str = "用户取消", db: Session = Depends(get_db)):
     """
     取消订单
     
@@ -260,7 +252,7 @@ async def cancel_user_order(order_id: int, reason: str = "用户取消", db: Ses
 
 
 @router.post("/process-all", response_model=OrderProcessingResult)
-async def process_all_orders(db: Session = Depends(get_db)):
+def process_all_orders(db: Session = Depends(get_db)):
     """
     处理所有待成交订单
     
@@ -285,7 +277,7 @@ async def process_all_orders(db: Session = Depends(get_db)):
 
 
 @router.get("/order/{order_id}", response_model=OrderOut)
-async def get_order_details(order_id: int, db: Session = Depends(get_db)):
+def get_order_details(order_id: int, db: Session = Depends(get_db)):
     """
     获取订单详情
     
@@ -311,7 +303,7 @@ async def get_order_details(order_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/health")
-async def orders_health_check(db: Session = Depends(get_db)):
+def orders_health_check(db: Session = Depends(get_db)):
     """
     订单服务健康检查
     
@@ -2,22 +2,50 @@
 Ranking API routes for factor-based stock rankings
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from functools import lru_cache
+import asyncio
+import numpy as np
+import orjson
 import pandas as pd
 import requests
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from database.connection import get_db
 from database.models import StockKline
+from database.types import decimal_as_float
 from factors import compute_all_factors, compute_selected_factors, list_factors
+from services.cache import ranking_cache, stock_info_cache
 
 router = APIRouter(prefix="/api/ranking", tags=["ranking"])
 
+_KLINE_PRICE_COLUMNS = (
+    StockKline.open_price,
+    StockKline.high_price,
+    StockKline.low_price,
+    StockKline.close_price,
+    StockKline.volume,
+    StockKline.amount,
+)
 
-@router.get("/factors")
-async def get_available_factors():
-    """Get list of available factors"""
+# Rows fetched per batch when streaming K-lines for the ranking table
+_KLINE_FETCH_BATCH = 5000
+
+# Upper bound on symbols per batch stock-info request
+_MAX_STOCK_INFO_SYMBOLS = 20
+
+
+class StockInfoBatchRequest(BaseModel):
+    symbols: List[str]
+
+
+@lru_cache(maxsize=1)
+def _available_factors() -> bytes:
+    """Encoded factor metadata; it is fixed for the lifetime of the process"""
     factors = list_factors()
     
     # Get all factor columns
@@ -33,7 +61,7 @@ async def get_available_factors():
         "sortable": True
     })
     
-    return {
+    return orjson.dumps({
         "success": True,
         "factors": [
             {
@@ -45,61 +73,83 @@ async def get_available_factors():
             for factor in factors
         ],
         "all_columns": all_columns
-    }
+    })
+
+
+@router.get("/factors")
+async def get_available_factors():
+    """Get list of available factors"""
+    return Response(content=_available_factors(), media_type="application/json")
 
 
 @router.get("/table")
-async def get_ranking_table(
+def get_ranking_table(
     db: Session = Depends(get_db),
     days: int = Query(100, description="Number of days of historical data to use"),
     factors: Optional[str] = Query(None, description="Comma-separated list of factor IDs to compute"),
     limit: int = Query(50, description="Maximum number of stocks to return")
 ):
     """Get ranking table based on factors computed from recent K-line data"""
-    # Calculate date range
     end_date = datetime.now().date()
+    # Cache the encoded response per parameter set; concurrent misses compute once
+    content = ranking_cache.get_or_set(
+        (end_date, days, factors, limit),
+        lambda: orjson.dumps(
+            _compute_ranking_table(db, end_date, days, factors, limit),
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        ),
+    )
+    return Response(content=content, media_type="application/json")
+
+
+def _compute_ranking_table(db: Session, end_date: date, days: int, factors: Optional[str], limit: int) -> dict:
+    """Query K-lines, compute factors and build the ranking table payload"""
+    # Calculate date range
     start_date = end_date - timedelta(days=days)
     
-    # Query K-line data for the specified period
-    kline_query = db.query(StockKline).filter(
-        StockKline.period == "1d",
-        StockKline.datetime_str >= start_date.strftime("%Y-%m-%d"),
-        StockKline.datetime_str <= end_date.strftime("%Y-%m-%d")
-    ).order_by(StockKline.symbol, StockKline.timestamp)
+    # Query K-line data for the specified period as plain columns (no ORM entities);
+    # prices are read as floats so the frame is built without per-row conversion
+    stmt = (
+        select(
+            StockKline.symbol,
+            StockKline.timestamp,
+            *(decimal_as_float(column) for column in _KLINE_PRICE_COLUMNS),
+        )
+        .where(
+            StockKline.period == "1d",
+            StockKline.datetime_str >= start_date.strftime("%Y-%m-%d"),
+            StockKline.datetime_str <= end_date.strftime("%Y-%m-%d"),
+        )
+        .order_by(StockKline.symbol, StockKline.timestamp)
+        .execution_options(yield_per=_KLINE_FETCH_BATCH)
+    )
+    # Stream rows in batches straight into per-column lists
+    symbols, timestamps, *price_values = ([] for _ in range(8))
+    for partition in db.execute(stmt).partitions():
+        for column, values in zip((symbols, timestamps, *price_values), zip(*partition)):
+            column.extend(values)
     
-    kline_data = kline_query.all()
-    
-    if not kline_data:
+    if not symbols:
         return {
             "success": True,
             "data": [],
             "message": "No K-line data found for the specified period"
         }
     
-    # Group data by symbol
-    history = {}
-    for kline in kline_data:
-        symbol = kline.symbol
-        if symbol not in history:
-            history[symbol] = []
-        
-        history[symbol].append({
-            "Date": kline.datetime_str,
-            "Open": float(kline.open_price) if kline.open_price else 0,
-            "High": float(kline.high_price) if kline.high_price else 0,
-            "Low": float(kline.low_price) if kline.low_price else 0,
-            "Close": float(kline.close_price) if kline.close_price else 0,
-            "Volume": float(kline.volume) if kline.volume else 0,
-            "Amount": float(kline.amount) if kline.amount else 0,
-        })
+    kline_df = pd.DataFrame({"Symbol": symbols, "Date": timestamps})
+    for name, values in zip(("Open", "High", "Low", "Close", "Volume", "Amount"), price_values):
+        column = np.array(values, dtype=np.float64)
+        # Missing prices count as 0
+        column[np.isnan(column)] = 0
+        kline_df[name] = column
+    # Dates come from the millisecond timestamp column, no string parsing needed
+    kline_df["Date"] = pd.to_datetime(kline_df["Date"], unit="ms")
     
-    # Convert to DataFrames
+    # Split by symbol into per-symbol DataFrames (rows are already in date order from the query)
     history_dfs = {}
-    for symbol, data in history.items():
-        if len(data) >= 10:  # Minimum data requirement
-            df = pd.DataFrame(data)
-            df["Date"] = pd.to_datetime(df["Date"], format='mixed')
-            history_dfs[symbol] = df.sort_values("Date")
+    for symbol, df in kline_df.groupby("Symbol", sort=False):
+        if len(df) >= 10:  # Minimum data requirement
+            history_dfs[symbol] = df.drop(columns="Symbol").reset_index(drop=True)
     
     if not history_dfs:
         return {
@@ -126,19 +176,19 @@ async def get_ranking_table(
     score_columns = [col for col in result_df.columns if 'score' in col.lower()]
     if len(score_columns) > 0:
         # Calculate mean of all score columns, ignoring NaN
-        result_df['Composite Score'] = result_df[score_columns].mean(axis=1, skipna=True)
-        # Sort by composite score descending
-        result_df = result_df.sort_values('Composite Score', ascending=False, na_position='last')
+        composite = _nanmean_rows(result_df[score_columns].to_numpy(dtype=np.float64))
+        result_df['Composite Score'] = composite
+        # Sort by composite score descending; when only the top `limit` rows are
+        # returned, select them first and sort just those
+        if 0 < limit < len(composite):
+            result_df = result_df.iloc[_top_indices(composite, limit)]
+        else:
+            result_df = result_df.sort_values('Composite Score', ascending=False, na_position='last')
     
-    # Convert to list of dictionaries and limit results
+    # Convert to list of dictionaries and limit results;
+    # NaN values are written as null when the payload is encoded with orjson
     result_data = result_df.head(limit).to_dict('records')
     
-    # Fill NaN values with None for JSON serialization
-    for row in result_data:
-        for key, value in row.items():
-            if pd.isna(value):
-                row[key] = None
-    
     return {
         "success": True,
         "data": result_data,
@@ -148,8 +198,26 @@ async def get_ranking_table(
     }
 
 
+def _nanmean_rows(values: np.ndarray) -> np.ndarray:
+    """Row-wise mean ignoring NaN; rows without any value stay NaN"""
+    counts = np.count_nonzero(~np.isnan(values), axis=1)
+    sums = np.nansum(values, axis=1)
+    return np.divide(sums, counts, out=np.full(len(values), np.nan), where=counts > 0)
+
+
+def _top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores in descending order, NaN last, ties in row order"""
+    keys = np.where(np.isnan(scores), np.inf, -scores)
+    # O(n) selection of the k-th key, then keep the earliest rows among ties at the boundary
+    kth = keys[np.argpartition(keys, k - 1)[k - 1]]
+    better = np.flatnonzero(keys < kth)
+    ties = np.flatnonzero(keys == kth)[:k - len(better)]
+    top = np.concatenate([better, ties])
+    return top[np.argsort(keys[top], kind="stable")]
+
+
 @router.get("/symbols")
-async def get_available_symbols(
+def get_available_symbols(
     db: Session = Depends(get_db),
     days: int = Query(100, description="Number of days to check for data availability")
 ):
@@ -175,8 +243,41 @@ async def get_available_symbols(
 
 
 @router.get("/stock-info/{symbol}")
-async def get_stock_basic_info(symbol: str, db: Session = Depends(get_db)):
+def get_stock_basic_info(symbol: str, db: Session = Depends(get_db)):
     """Get basic information for a stock symbol using yfinance"""
+    return _get_stock_info(symbol)
+
+
+@router.post("/stock-info")
+async def get_stock_basic_info_batch(request: StockInfoBatchRequest):
+    """Get basic information for several symbols, fetched concurrently"""
+    symbols = list(dict.fromkeys(s.strip() for s in request.symbols if s.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="symbols must not be empty")
+    if len(symbols) > _MAX_STOCK_INFO_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {_MAX_STOCK_INFO_SYMBOLS} symbols per request")
+    
+    results = await asyncio.gather(*(asyncio.to_thread(_get_stock_info, symbol) for symbol in symbols))
+    return {
+        "success": True,
+        "data": dict(zip(symbols, results))
+    }
+
+
+def _get_stock_info(symbol: str) -> dict:
+    """Company info for one symbol, served from the daily cache when available"""
+    cached = stock_info_cache.get(symbol)
+    if cached is not None:
+        return cached
+    result = _fetch_stock_info(symbol)
+    # Failures are not cached so the next request retries upstream
+    if result["success"]:
+        stock_info_cache.set(symbol, result)
+    return result
+
+
+def _fetch_stock_info(symbol: str) -> dict:
+    """Fetch and format yfinance company info for one symbol"""
     try:
         import yfinance as yf
         
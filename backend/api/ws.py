@@ -1,140 +1,314 @@
 from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
-from typing import Dict, Set
-import json
+from collections import defaultdict
+from itertools import chain
+from decimal import Decimal
+from typing import DefaultDict, Dict, Optional, Set, Tuple
+import asyncio
+import hashlib
+import threading
+import orjson
 
-from database.connection import SessionLocal
+from database.connection import SessionFactory
 from repositories.user_repo import get_or_create_user, get_user
-from repositories.order_repo import list_orders
-from repositories.position_repo import list_positions
-from services.asset_calculator import calc_positions_value
-from services.market_data import get_last_price
-from services.scheduler import add_user_snapshot_job, remove_user_snapshot_job
-from database.models import Trade
+from repositories.order_repo import list_order_rows
+from repositories.position_repo import list_position_rows
+from services.market_data import get_last_prices
+from services.cache import recent_trades_cache, snapshot_rows_cache
+from services.scheduler import add_snapshot_broadcast_job, remove_snapshot_broadcast_job
+from database.models import Order, Position, Trade, User
+from database.types import decimal_as_float
+
+# 单个连接发送超时（秒），超时的连接视为失效
+_SEND_TIMEOUT = 2.0
+
+# 每个连接的待发送消息上限，队列满时丢弃最旧的消息
+_OUTBOX_SIZE = 8
+
+# 快照中的最近成交条数
+_RECENT_TRADES_LIMIT = 200
+
+# 快照内容未变化时发送的心跳消息（预先编码）
+_HEARTBEAT_PAYLOAD = orjson.dumps({"type": "heartbeat"}).decode()
 
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
+        self.active_connections: DefaultDict[int, Set[WebSocket]] = defaultdict(set)
+        # 每个用户最近一次推送的快照摘要
+        self._snapshot_digests: Dict[int, bytes] = {}
+        # 每个连接一个发送队列，生产者只入队，不等待网络写入；发送任务由连接的端点持有
+        self._outboxes: Dict[WebSocket, asyncio.Queue] = {}
 
     async def connect(self, websocket: WebSocket):
         pass  # WebSocket is already accepted in the endpoint
 
+    def open(self, websocket: WebSocket) -> asyncio.Queue:
+        """创建连接的发送队列，由调用方运行 _sender 消费"""
+        outbox = asyncio.Queue(maxsize=_OUTBOX_SIZE)
+        self._outboxes[websocket] = outbox
+        return outbox
+
+    def close(self, websocket: WebSocket):
+        self._outboxes.pop(websocket, None)
+
     def register(self, user_id: int, websocket: WebSocket):
-        self.active_connections.setdefault(user_id, set()).add(websocket)
-        # 为新用户添加定时快照任务
-        add_user_snapshot_job(user_id, interval_seconds=10)
+        self.active_connections[user_id].add(websocket)
+        # 所有在线用户共用一个定时快照广播任务（已存在时不重复添加）
+        add_snapshot_broadcast_job(interval_seconds=10)
 
     def unregister(self, user_id: int, websocket: WebSocket):
         if user_id in self.active_connections:
             self.active_connections[user_id].discard(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
-                # 移除该用户的定时任务
-                remove_user_snapshot_job(user_id)
+                self._snapshot_digests.pop(user_id, None)
+                # 最后一个用户离线时移除广播任务
+                if not self.active_connections:
+                    remove_snapshot_broadcast_job()
 
     async def send_to_user(self, user_id: int, message: dict):
         if user_id not in self.active_connections:
             return
-        payload = json.dumps(message, ensure_ascii=False)
-        for ws in list(self.active_connections[user_id]):
+        # 每条消息只编码一次，发给该用户的所有连接；仍以文本帧发送，前端按字符串解析
+        await self._send_payload(user_id, orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode())
+
+    async def send_snapshot(self, user_id: int, message: dict, skip_unchanged: bool = False):
+        """推送快照；skip_unchanged 时内容与上次相同则只发送心跳"""
+        if user_id not in self.active_connections:
+            return
+        # 快照由按列查询的行字典组成，键均为字符串，不需要较慢的 OPT_NON_STR_KEYS
+        payload = orjson.dumps(message)
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        if skip_unchanged and self._snapshot_digests.get(user_id) == digest:
+            await self._send_payload(user_id, _HEARTBEAT_PAYLOAD)
+            return
+        self._snapshot_digests[user_id] = digest
+        await self._send_payload(user_id, payload.decode())
+
+    async def _send_payload(self, user_id: int, payload: str):
+        """放入该用户所有连接的发送队列，不阻塞调用方"""
+        for ws in list(self.active_connections.get(user_id, ())):
+            self.enqueue(ws, payload)
+
+    def enqueue(self, websocket: WebSocket, payload: str) -> bool:
+        """放入连接的发送队列，队列满时丢弃最旧的消息；连接未注册时返回 False"""
+        outbox = self._outboxes.get(websocket)
+        if outbox is None:
+            return False
+        if outbox.full():
+            outbox.get_nowait()
+        outbox.put_nowait(payload)
+        return True
+
+    async def _sender(self, websocket: WebSocket, outbox: asyncio.Queue):
+        """按顺序发送某个连接队列中的消息，发送失败或超时则移除该连接"""
+        while True:
+            payload = await outbox.get()
             try:
-                await ws.send_text(payload)
+                await asyncio.wait_for(websocket.send_text(payload), _SEND_TIMEOUT)
             except Exception:
                 # remove broken connection
-                self.active_connections[user_id].discard(ws)
+                for user_id in [uid for uid, conns in self.active_connections.items() if websocket in conns]:
+                    self.unregister(user_id, websocket)
+                self.close(websocket)
+                return
 
 
 manager = ConnectionManager()
 
 
-async def _send_snapshot(db: Session, user_id: int):
-    user = get_user(db, user_id)
-    if not user:
-        return
-    positions = list_positions(db, user_id)
-    orders = list_orders(db, user_id)
-    trades = (
-        db.query(Trade).filter(Trade.user_id == user_id).order_by(Trade.trade_time.desc()).limit(200).all()
+def _recent_trade_rows(db: Session, user_id: int, limit: int = _RECENT_TRADES_LIMIT, after_id: Optional[int] = None) -> list:
+    """最近成交记录（按成交时间倒序），直接返回字典；after_id 只查询该 ID 之后新增的成交"""
+    stmt = (
+        select(
+            Trade.id,
+            Trade.order_id,
+            Trade.user_id,
+            Trade.symbol,
+            Trade.name,
+            Trade.market,
+            Trade.side,
+            decimal_as_float(Trade.price).label("price"),
+            Trade.quantity,
+            decimal_as_float(Trade.commission).label("commission"),
+            Trade.trade_time,
+        )
+        .where(Trade.user_id == user_id)
+        .order_by(Trade.trade_time.desc())
+        .limit(limit)
     )
-    positions_value = calc_positions_value(db, user_id)
+    if after_id is not None:
+        stmt = stmt.where(Trade.id > after_id)
+    return [
+        {**row, "trade_time": str(row["trade_time"])}
+        for row in db.execute(stmt).mappings()
+    ]
+
+
+def _account_row(db: Session, user_id: int):
+    """快照概览所需的账户字段，按列查询，不加载 User 实例"""
+    stmt = select(
+        User.id,
+        User.username,
+        decimal_as_float(User.initial_capital).label("initial_capital"),
+        decimal_as_float(User.current_cash).label("current_cash"),
+        decimal_as_float(User.frozen_cash).label("frozen_cash"),
+    ).where(User.id == user_id)
+    return db.execute(stmt).mappings().first()
+
+
+# 有新成交提交、最近成交缓存需要增量更新的用户
+_new_trade_users: Set[int] = set()
+
+
+def _recent_trades(db: Session, user_id: int) -> tuple:
+    """最近成交行，优先读缓存；有新成交时只查询新增的行并拼到缓存前面"""
+    trades = recent_trades_cache.get(user_id)
+    if trades is None:
+        _new_trade_users.discard(user_id)
+        trades = tuple(_recent_trade_rows(db, user_id))
+        recent_trades_cache.set(user_id, trades)
+    elif user_id in _new_trade_users:
+        # 先清除标记再查询，查询期间提交的成交会在下次读取时补上
+        _new_trade_users.discard(user_id)
+        newest_id = max((t["id"] for t in trades), default=0)
+        fresh = _recent_trade_rows(db, user_id, after_id=newest_id)
+        if fresh:
+            trades = (tuple(fresh) + trades)[:_RECENT_TRADES_LIMIT]
+            recent_trades_cache.set(user_id, trades)
+    return trades
+
+
+# 每个用户的快照数据版本，提交涉及该用户的写入时递增
+_snapshot_generations: Dict[int, int] = {}
+# 版本检查与写缓存、版本递增与失效需成对原子执行
+_snapshot_generation_lock = threading.Lock()
+
+
+def _snapshot_rows(db: Session, user_id: int):
+    """快照所需的账户/持仓/订单/成交行，优先读缓存；用户不存在时返回 None"""
+    rows = snapshot_rows_cache.get(user_id)
+    if rows is None:
+        generation = _snapshot_generations.get(user_id, 0)
+        account = _account_row(db, user_id)
+        if not account:
+            return None
+        rows = (
+            dict(account),
+            list_position_rows(db, user_id),
+            list_order_rows(db, user_id),
+        )
+        # 查询期间有涉及该用户的提交时，读到的行可能已过期，本次使用但不写入缓存
+        with _snapshot_generation_lock:
+            if _snapshot_generations.get(user_id, 0) == generation:
+                snapshot_rows_cache.set(user_id, rows)
+    return rows + (_recent_trades(db, user_id),)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_snapshot_users(session: Session, flush_context):
+    """记录本次事务中写入了账户/持仓/订单/成交的用户"""
+    users = session.info.setdefault("snapshot_users", set())
+    trade_users = session.info.setdefault("new_trade_users", set())
+    for obj in session.new:
+        if isinstance(obj, Trade):
+            trade_users.add(obj.user_id)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, User):
+            users.add(obj.id)
+        elif isinstance(obj, (Position, Order)):
+            users.add(obj.user_id)
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, Trade):
+            # 已有成交被修改/删除时不能增量更新，整体失效
+            session.info.setdefault("stale_trade_users", set()).add(obj.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_snapshot_rows(session: Session):
+    for user_id in session.info.pop("snapshot_users", ()):
+        with _snapshot_generation_lock:
+            _snapshot_generations[user_id] = _snapshot_generations.get(user_id, 0) + 1
+            snapshot_rows_cache.pop(user_id)
+    _new_trade_users.update(session.info.pop("new_trade_users", ()))
+    for user_id in session.info.pop("stale_trade_users", ()):
+        recent_trades_cache.pop(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_snapshot_users(session: Session):
+    session.info.pop("snapshot_users", None)
+    session.info.pop("new_trade_users", None)
+    session.info.pop("stale_trade_users", None)
+
+
+async def _send_snapshot(
+    db: Session,
+    user_id: int,
+    prices: Optional[Dict[Tuple[str, str], float]] = None,
+    price_errors: Optional[Dict[Tuple[str, str], Exception]] = None,
+    skip_unchanged: bool = False,
+):
+    """
+    推送用户快照
+    prices/price_errors 为调用方已批量获取的价格（定时广播时所有用户共用），缺失的股票再单独获取
+    skip_unchanged 为 True 时（定时广播），快照与上次推送相同则只发送心跳
+    """
+    # 查询在线程池中执行；同一连接的消息按顺序处理，会话不会被并发使用
+    rows = await asyncio.to_thread(_snapshot_rows, db, user_id)
+    if rows is None:
+        return
+    # 账户/持仓/订单/成交按列查询为字典，数据未变化时复用缓存；持仓行会补充价格字段，需复制
+    account, cached_positions, orders, trades = rows
+    positions = [dict(p) for p in cached_positions]
     
-    overview = {
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "initial_capital": float(user.initial_capital),
-            "current_cash": float(user.current_cash),
-            "frozen_cash": float(user.frozen_cash),
-        },
-        "total_assets": positions_value + float(user.current_cash),
-        "positions_value": positions_value,
-    }
-    # enrich positions with latest price and market value
-    enriched_positions = []
+    # enrich positions with latest price and market value;
+    # 持仓市值由同一批价格累加，不再单独查询持仓并重复取价
     price_error_message = None
+    positions_total = Decimal("0")
+    prices = dict(prices or {})
+    price_errors = dict(price_errors or {})
+    # 一次批量获取尚无价格的持仓
+    missing = [
+        (p["symbol"], p["market"]) for p in positions
+        if (p["symbol"], p["market"]) not in prices and (p["symbol"], p["market"]) not in price_errors
+    ]
+    if missing:
+        # 批量取价在线程池中等待，不阻塞事件循环上的其他连接
+        fetched, fetch_errors = await asyncio.to_thread(get_last_prices, missing)
+        prices.update(fetched)
+        price_errors.update(fetch_errors)
     
     for p in positions:
-        try:
-            price = get_last_price(p.symbol, p.market)
-        except Exception as e:
-            price = None
+        key = (p["symbol"], p["market"])
+        price = prices.get(key)
+        if key in price_errors:
             # 收集价格获取错误信息，特别是cookie相关的错误
-            error_msg = str(e)
+            error_msg = str(price_errors[key])
             if "cookie" in error_msg.lower() and price_error_message is None:
                 price_error_message = error_msg
         
-        enriched_positions.append({
-            "id": p.id,
-            "user_id": p.user_id,
-            "symbol": p.symbol,
-            "name": p.name,
-            "market": p.market,
-            "quantity": p.quantity,
-            "available_quantity": p.available_quantity,
-            "avg_cost": float(p.avg_cost),
-            "last_price": float(price) if price is not None else None,
-            "market_value": (float(price) * p.quantity) if price is not None else None,
-        })
+        p["last_price"] = float(price) if price is not None else None
+        p["market_value"] = (float(price) * p["quantity"]) if price is not None else None
+        if price is not None and p["quantity"] > 0:
+            positions_total += Decimal(str(price)) * Decimal(p["quantity"])
+    
+    positions_value = float(positions_total)
+    overview = {
+        "user": account,
+        "total_assets": positions_value + account["current_cash"],
+        "positions_value": positions_value,
+    }
 
     # 准备响应数据
     response_data = {
         "type": "snapshot",
         "overview": overview,
-        "positions": enriched_positions,
-        "orders": [
-            {
-                "id": o.id,
-                "order_no": o.order_no,
-                "user_id": o.user_id,
-                "symbol": o.symbol,
-                "name": o.name,
-                "market": o.market,
-                "side": o.side,
-                "order_type": o.order_type,
-                "price": float(o.price) if o.price is not None else None,
-                "quantity": o.quantity,
-                "filled_quantity": o.filled_quantity,
-                "status": o.status,
-            }
-            for o in orders
-        ],
-        "trades": [
-            {
-                "id": t.id,
-                "order_id": t.order_id,
-                "user_id": t.user_id,
-                "symbol": t.symbol,
-                "name": t.name,
-                "market": t.market,
-                "side": t.side,
-                "price": float(t.price),
-                "quantity": t.quantity,
-                "commission": float(t.commission),
-                "trade_time": str(t.trade_time),
-            }
-            for t in trades
-        ],
+        "positions": positions,
+        "orders": orders,
+        "trades": trades,
     }
     
     # 如果有价格获取错误，添加警告信息
@@ -144,36 +318,88 @@ async def _send_snapshot(db: Session, user_id: int):
             "message": price_error_message
         }
     
-    await manager.send_to_user(user_id, response_data)
+    await manager.send_snapshot(user_id, response_data, skip_unchanged=skip_unchanged)
+
+
+def _bootstrap_user(db: Session, username: str, initial_capital: float) -> Tuple[int, str]:
+    """获取或创建用户，返回 (id, username)，避免在事件循环上触发过期属性的刷新查询"""
+    user = get_or_create_user(db, username, initial_capital)
+    # 提交前读取属性：提交后属性会过期，再访问会多一次查询
+    user_id, name = user.id, user.username
+    db.commit()
+    return user_id, name
+
+
+def _place_order(db: Session, user_id: int, **order_fields) -> Optional[int]:
+    """创建委托订单并提交，返回订单 ID；用户不存在时返回 None"""
+    from services.order_matching import create_order
+    
+    user = get_user(db, user_id)
+    if not user:
+        return None
+    order = create_order(db=db, user=user, **order_fields)
+    db.commit()
+    return order.id
+
+
+async def _reply(websocket: WebSocket, message: dict):
+    """回复当前连接（错误、pong 等）；走发送队列，保证与推送消息的顺序"""
+    payload = orjson.dumps(message).decode()
+    if not manager.enqueue(websocket, payload):
+        await websocket.send_text(payload)
+
+
+async def _receive_message(websocket: WebSocket) -> dict:
+    """接收一条客户端指令，文本帧和二进制帧（UTF-8 JSON）都支持"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    data = message.get("text")
+    if data is None:
+        data = message.get("bytes")
+    return orjson.loads(data)
 
 
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    outbox = manager.open(websocket)
+    try:
+        # 发送任务属于本连接的 TaskGroup：消息循环结束（断开或异常）时取消并等待其退出后才返回
+        async with asyncio.TaskGroup() as tg:
+            sender = tg.create_task(manager._sender(websocket, outbox))
+            await _message_loop(websocket)
+            sender.cancel()
+    finally:
+        manager.close(websocket)
+
+
+async def _message_loop(websocket: WebSocket):
+    """处理一个连接的客户端指令，连接断开时返回"""
     user_id: int | None = None
+    # 每个连接复用一个会话，连接断开时关闭
+    db: Session = SessionFactory()
     
     try:
         while True:
-            data = await websocket.receive_text()
-            msg = json.loads(data)
+            msg = await _receive_message(websocket)
             kind = msg.get("type")
-            db: Session = SessionLocal()
             try:
                 if kind == "bootstrap":
-                    user = get_or_create_user(
-                        db, 
+                    user_id, username = await asyncio.to_thread(
+                        _bootstrap_user,
+                        db,
                         msg.get("username", "demo"),
                         float(msg.get("initial_capital", 100000))
                     )
-                    user_id = user.id
                     manager.register(user_id, websocket)
-                    await manager.send_to_user(user_id, {"type": "bootstrap_ok", "user": {"id": user.id, "username": user.username}})
+                    await manager.send_to_user(user_id, {"type": "bootstrap_ok", "user": {"id": user_id, "username": username}})
                     await _send_snapshot(db, user_id)
                 elif kind == "subscribe":
                     # subscribe existing user_id
                     uid = int(msg.get("user_id"))
-                    u = get_user(db, uid)
+                    u = await asyncio.to_thread(get_user, db, uid)
                     if not u:
-                        await websocket.send_text(json.dumps({"type": "error", "message": "user not found"}))
+                        await _reply(websocket, {"type": "error", "message": "user not found"})
                         continue
                     user_id = uid
                     manager.register(user_id, websocket)
@@ -183,19 +409,10 @@ async def websocket_endpoint(websocket: WebSocket):
                         await _send_snapshot(db, user_id)
                 elif kind == "place_order":
                     if user_id is None:
-                        await websocket.send_text(json.dumps({"type": "error", "message": "not authenticated"}))
+                        await _reply(websocket, {"type": "error", "message": "not authenticated"})
                         continue
                     
                     try:
-                        # Import the order creation service
-                        from services.order_matching import create_order
-                        
-                        # Get user object
-                        user = get_user(db, user_id)
-                        if not user:
-                            await websocket.send_text(json.dumps({"type": "error", "message": "user not found"}))
-                            continue
-                        
                         # Extract order parameters
                         symbol = msg.get("symbol")
                         name = msg.get("name", symbol)  # Use symbol as name if not provided
@@ -207,20 +424,19 @@ async def websocket_endpoint(websocket: WebSocket):
                         
                         # Validate required parameters
                         if not all([symbol, side, order_type, quantity]):
-                            await websocket.send_text(json.dumps({"type": "error", "message": "missing required parameters"}))
+                            await _reply(websocket, {"type": "error", "message": "missing required parameters"})
                             continue
                         
                         # Convert quantity to int
                         try:
                             quantity = int(quantity)
                         except (ValueError, TypeError):
-                            await websocket.send_text(json.dumps({"type": "error", "message": "invalid quantity"}))
+                            await _reply(websocket, {"type": "error", "message": "invalid quantity"})
                             continue
                         
-                        # Create the order
-                        order = create_order(
-                            db=db,
-                            user=user,
+                        # Create and commit the order in the thread pool
+                        order_id = await asyncio.to_thread(
+                            _place_order, db, user_id,
                             symbol=symbol,
                             name=name,
                             market=market,
@@ -229,36 +445,38 @@ async def websocket_endpoint(websocket: WebSocket):
                             price=price,
                             quantity=quantity
                         )
-                        
-                        # Commit the order
-                        db.commit()
+                        if order_id is None:
+                            await _reply(websocket, {"type": "error", "message": "user not found"})
+                            continue
                         
                         # Send success response
-                        await manager.send_to_user(user_id, {"type": "order_pending", "order_id": order.id})
+                        await manager.send_to_user(user_id, {"type": "order_pending", "order_id": order_id})
                         
                         # Send updated snapshot
                         await _send_snapshot(db, user_id)
                         
                     except ValueError as e:
                         # Business logic errors (insufficient funds, etc.)
-                        await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
+                        await _reply(websocket, {"type": "error", "message": str(e)})
                     except Exception as e:
                         # Unexpected errors
                         import traceback
                         print(f"Order placement error: {e}")
                         print(traceback.format_exc())
-                        await websocket.send_text(json.dumps({"type": "error", "message": f"order placement failed: {str(e)}"}))
+                        await _reply(websocket, {"type": "error", "message": f"order placement failed: {str(e)}"})
                 elif kind == "ping":
-                    await websocket.send_text(json.dumps({"type": "pong"}))
+                    await _reply(websocket, {"type": "pong"})
                 else:
-                    await websocket.send_text(json.dumps({"type": "error", "message": "unknown message"}))
+                    await _reply(websocket, {"type": "error", "message": "unknown message"})
             finally:
-                db.close()
+                # 每条消息处理完结束事务并使已加载对象过期，下一条消息读取最新数据
+                db.rollback()
     except WebSocketDisconnect:
         if user_id is not None:
             manager.unregister(user_id, websocket)
         return
     finally:
         # 确保用户断开连接时清理资源
+        db.close()
         if user_id is not None:
             manager.unregister(user_id, websocket)
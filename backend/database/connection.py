@@ -3,16 +3,20 @@ from sqlalchemy.orm import sessionmaker, declarative_base, scoped_session
 
 DATABASE_URL = "sqlite:///./data.db"
 
+# 同步端点运行在线程池中，连接池需覆盖并发的工作线程数
 engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+    DATABASE_URL, connect_args={"check_same_thread": False}, pool_size=20, max_overflow=10
 )
-SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 线程本地会话，供后台任务/WebSocket 使用；请求级会话由 get_db 独立创建
+SessionLocal = scoped_session(SessionFactory)
 
 Base = declarative_base()
 
 
 def get_db():
-    db = SessionLocal()
+    # 同步端点在线程池中执行，依赖与端点可能落在不同线程，不能使用线程本地会话
+    db = SessionFactory()
     try:
         yield db
     finally:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DECIMAL, TIMESTAMP, ForeignKey, UniqueConstraint, Float, Date, DateTime
+from sqlalchemy import Column, Integer, String, DECIMAL, TIMESTAMP, ForeignKey, UniqueConstraint, Index, Float, Date, DateTime
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import datetime
@@ -103,6 +103,8 @@ class Trade(Base):
 
     order = relationship("Order", back_populates="trades")
 
+    __table_args__ = (Index('ix_trades_user_time', 'user_id', 'trade_time'),)
+
 
 class TradingConfig(Base):
     __tablename__ = "trading_configs"
@@ -174,6 +176,21 @@ class StockKline(Base):
     __table_args__ = (UniqueConstraint('symbol', 'market', 'period', 'timestamp'),)
 
 
+class UserDailySnapshot(Base):
+    """用户每日资产快照（资产曲线的物化结果，只保存已结束的日期；成交或价格写入时删除受影响日期起的快照）"""
+    __tablename__ = "user_daily_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    snapshot_date = Column(Date, nullable=False)
+    cash = Column(Float, nullable=False)
+    positions_value = Column(Float, nullable=False)
+    total_assets = Column(Float, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+
+    __table_args__ = (UniqueConstraint('user_id', 'snapshot_date'),)
+
+
 # US market trading configuration constants
 US_MIN_COMMISSION = 1.0  # $1 minimum commission
 US_COMMISSION_RATE = 0.005  # 0.5% commission rate
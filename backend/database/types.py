@@ -0,0 +1,26 @@
+"""
+自定义列类型
+"""
+
+from sqlalchemy import Float, cast
+from sqlalchemy.types import TypeDecorator
+
+
+class RoundedFloat(TypeDecorator):
+    """按 REAL 读取 DECIMAL 列，并按列精度四舍五入，结果与 float(ORM 读出的 Decimal) 一致"""
+
+    impl = Float
+    cache_ok = True
+
+    def __init__(self, scale: int):
+        super().__init__()
+        self.scale = scale
+
+    def process_result_value(self, value, dialect):
+        # SQLite 中 DECIMAL 按原始浮点数存储，ORM 读取时按精度舍入；round 的舍入结果与之相同
+        return None if value is None else round(value, self.scale)
+
+
+def decimal_as_float(column):
+    """把 DECIMAL 列作为 float 查询（只读投影用），不经过 Decimal 转换"""
+    return cast(column, RoundedFloat(column.type.scale))
@@ -3,20 +3,26 @@ from __future__ import annotations
 from __future__ import annotations
 
 import importlib
+import os
 import pkgutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 import pandas as pd
 
 from models import Factor
+from ._history import sort_history
 
 __all__ = ["list_factors", "compute_all_factors", "compute_selected_factors"]
 
+# Shared pool for computing factors concurrently within a request
+_FACTOR_EXECUTOR = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="factor")
+
 
 def _iter_factor_modules() -> List[str]:
     modules = []
     package = __name__  # 'factors'
     for _, name, ispkg in pkgutil.iter_modules(__path__):  # type: ignore[name-defined]
-        if name in {"__init__"}:
+        if name in {"__init__"} or name.startswith("_"):
             continue
         modules.append(f"{package}.{name}")
     return modules
@@ -39,12 +45,16 @@ def list_factors() -> List[Factor]:
     return factors
 
 
-def compute_all_factors(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.DataFrame] = None) -> pd.DataFrame:
-    """Compute all registered factor DataFrames and outer-join them by 'Symbol'."""
+def _compute_factors(factors: List[Factor], history: Dict[str, pd.DataFrame], top_spot: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """Compute the given factors and outer-join their results by 'Symbol' in one concat."""
     dfs: List[pd.DataFrame] = []
-    for factor in list_factors():
+    # Factors index rows by position, so every history frame is date-sorted once here for all of them
+    history = sort_history(history)
+    # Factors are independent, so they run side by side; results are collected in registration order
+    futures = [(factor, _FACTOR_EXECUTOR.submit(factor.compute, history, top_spot)) for factor in factors]
+    for factor, future in futures:
         try:
-            df = factor.compute(history, top_spot)
+            df = future.result()
             if df is not None and not df.empty:
                 if 'Symbol' not in df.columns:
                     continue
@@ -54,36 +64,21 @@ def compute_all_factors(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.
             logging.getLogger(__name__).warning(f"Factor {factor.id} failed: {e}")
     if not dfs:
         return pd.DataFrame()
-    result = dfs[0]
-    for df in dfs[1:]:
-        result = result.merge(df, on='Symbol', how='outer')
-    return result
+    if len(dfs) == 1:
+        return dfs[0]
+    # Align on Symbol once instead of chaining pairwise merges; sorted like an outer merge
+    result = pd.concat([df.set_index('Symbol') for df in dfs], axis=1, join='outer')
+    return result.sort_index().reset_index()
+
+
+def compute_all_factors(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Compute all registered factor DataFrames and outer-join them by 'Symbol'."""
+    return _compute_factors(list_factors(), history, top_spot)
 
 
 def compute_selected_factors(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.DataFrame] = None, selected_factor_ids: Optional[List[str]] = None) -> pd.DataFrame:
     """Compute only selected factor DataFrames and outer-join them by 'Symbol'."""
     if selected_factor_ids is None:
         return compute_all_factors(history, top_spot)
-    
-    dfs: List[pd.DataFrame] = []
-    all_factors = list_factors()
-    selected_factors = [f for f in all_factors if f.id in selected_factor_ids]
-    
-    for factor in selected_factors:
-        try:
-            df = factor.compute(history, top_spot)
-            if df is not None and not df.empty:
-                if 'Symbol' not in df.columns:
-                    continue
-                dfs.append(df)
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).warning(f"Factor {factor.id} failed: {e}")
-    
-    if not dfs:
-        return pd.DataFrame()
-    
-    result = dfs[0]
-    for df in dfs[1:]:
-        result = result.merge(df, on='Symbol', how='outer')
-    return result
+    selected_factors = [f for f in list_factors() if f.id in selected_factor_ids]
+    return _compute_factors(selected_factors, history, top_spot)
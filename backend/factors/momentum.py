@@ -5,74 +5,79 @@ import pandas as pd
 import numpy as np
 
 from models import Factor
+from ._history import concat_columns, sort_by_date
 
 
+def _momentum_values(frames: List[pd.DataFrame]) -> np.ndarray:
+    """Momentum for each date-sorted frame (at least 2 rows each) computed over the concatenated columns.
+
+    The first row of each frame gives the first low/close and the later-half low is a NaN-skipping
+    min over each frame's second half.
+    """
+    sizes = np.fromiter((len(df) for df in frames), dtype=np.int64, count=len(frames))
+    starts, (low, close) = concat_columns(frames, 'Low', 'Close')
+    
+    first_low = low[starts]
+    first_close = close[starts]
+    # Segments alternate [frame start, half start) / [half start, next frame start); keep the second halves
+    bounds = np.empty(2 * len(frames), dtype=np.int64)
+    bounds[0::2] = starts
+    bounds[1::2] = starts + sizes // 2
+    second_half_low = np.fmin.reduceat(low, bounds)[1::2]
+    
+    invalid = np.isnan(first_low) | np.isnan(second_half_low) | np.isnan(first_close) | (first_close == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        momentum = (second_half_low - first_low) / first_close
+    momentum[invalid] = 0.0
+    return momentum
+
+
+def _descending_order(values: np.ndarray) -> np.ndarray:
+    """Descending argsort with the same tie order as sort_values(ascending=False) on NaN-free data"""
+    positions = np.arange(len(values))[::-1]
+    return positions[values[::-1].argsort(kind="quicksort")][::-1]
+
 
 def calculate_momentum_simple(df: pd.DataFrame) -> float:
     """Calculate (later-period low - first-period low) / first close price"""
     if len(df) < 2:
         return 0.0
-    
-    # Convert date column to datetime for proper sorting if needed
-    df_copy = df.copy()
-    if not pd.api.types.is_datetime64_any_dtype(df_copy['Date']):
-        df_copy['Date'] = pd.to_datetime(df_copy['Date'])
-    
-    # Sort by date (oldest first)
-    df_sorted = df_copy.sort_values("Date", ascending=True)
-    df_sorted = df_sorted.reset_index(drop=True)
-    
-    # Calculate the necessary values
-    # First candle low and close in the window
-    half_idx = len(df_sorted) // 2
-    first_low = df_sorted.iloc[0]["Low"]
-    first_close = df_sorted.iloc[0]["Close"]
-    
-    # Minimum price in second half of period
-    second_half_low = df_sorted.iloc[half_idx:]["Low"].min()
-    
-    # Check for invalid data
-    if pd.isna(first_low) or pd.isna(second_half_low) or pd.isna(first_close):
-        return 0.0
-    
-    first_low = float(first_low)
-    second_half_low = float(second_half_low)
-    first_close = float(first_close)
-    
-    if first_close == 0:
-        return 0.0
-    
-    return (second_half_low - first_low) / first_close
+    return float(_momentum_values([sort_by_date(df)])[0])
 
 
 def compute_momentum(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """Calculate momentum factor using formula: (later-period low - first-period low) / first close price
     
     Args:
-        history: Historical price data
+        history: Historical price data, each frame sorted by date (see _compute_factors)
         top_spot: Optional spot data (unused)
     """
-    rows: List[dict] = []
-    
+    codes: List[str] = []
+    frames: List[pd.DataFrame] = []
     for code, df in history.items():
         if df is None or df.empty or len(df) < 2:
             continue
-        
-        momentum = calculate_momentum_simple(df)
-        score = (np.tanh(momentum) + 1) / 2
-
-        rows.append({
-            "Symbol": code, 
-            "Momentum": momentum,
-            "Momentum Score": score
-        })
+        codes.append(code)
+        frames.append(df)
+    
+    if not codes:
+        return pd.DataFrame()
     
-    # Sort by momentum factor from high to low
-    df_result = pd.DataFrame(rows)
-    if not df_result.empty:
-        df_result = df_result.sort_values("Momentum", ascending=False)
+    # All symbols are computed in one vectorized pass instead of one pandas round trip each
+    momentum = _momentum_values(frames)
+    score = (np.tanh(momentum) + 1) / 2
     
-    return df_result
+    # Sort by momentum factor from high to low; columns are permuted as arrays and the frame is
+    # built once, keeping the pre-sort row labels as sort_values would
+    order = _descending_order(momentum)
+    return pd.DataFrame(
+        {
+            "Symbol": [codes[i] for i in order],
+            "Momentum": momentum[order],
+            "Momentum Score": score[order],
+        },
+        index=order,
+    )
 
 
 MOMENTUM_FACTOR = Factor(
@@ -1,108 +1,94 @@
 from __future__ import annotations
 
-from typing import Dict, Optional, List
+from typing import Dict, Optional
 import pandas as pd
 import numpy as np
 
 from models import Factor
+from ._history import concat_columns
 
 
-def calculate_days_from_longest_candle(df_window):
-    """Days since candle with largest real body (vectorized)."""
-    if len(df_window) < 2:
-        return 0
+def calculate_days_from_longest_candle(opens: np.ndarray, closes: np.ndarray, first_close: np.ndarray) -> np.ndarray:
+    """Days since candle with largest real body (vectorized over symbols).
+
+    opens/closes are (symbols, window) arrays of the candles after the reference candle;
+    first_close holds each symbol's reference close.
+    """
+    if closes.shape[1] < 1:
+        return np.zeros(len(closes), dtype=np.int64)
     
     # Calculate real body length relative to prior close
-    first_close = df_window.iloc[0]['Close']
-    body_lengths = (df_window.iloc[1:]['Close'] - df_window.iloc[1:]['Open']).abs() * 100 / first_close
+    with np.errstate(divide="ignore", invalid="ignore"):
+        body_lengths = np.abs(closes - opens) * 100 / first_close[:, None]
     
-    # Find index of maximum body (searching from end prefers recent when tied)
-    max_idx_rev = body_lengths.iloc[::-1].idxmax()
+    # Find position of maximum body (searching from end prefers recent when tied; NaN bodies are skipped)
+    max_pos_rev = np.nanargmax(body_lengths[:, ::-1], axis=1)
     
     # Days counted from latest candle backward
-    return len(df_window) - 1 - max_idx_rev + 1
+    return max_pos_rev + 1
 
 
 def compute_support(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.DataFrame] = None, window_size: int = 60) -> pd.DataFrame:
     """Calculate support factor using days from longest candle
     
     Args:
-        history: Historical price data
+        history: Historical price data, each frame sorted by date (see _compute_factors)
         top_spot: Optional spot data (unused)
         window_size: Number of days to look back for analysis (default: 60)
     """
-    rows: List[dict] = []
+    # Require at least window_size + 1 days for meaningful analysis (extra day for previous close)
+    eligible = [
+        (code, df) for code, df in history.items()
+        if df is not None and not df.empty and len(df) >= window_size + 1
+    ]
+    if not eligible:
+        return pd.DataFrame()
     
-    for code, df in history.items():
-        # Require at least window_size + 1 days for meaningful analysis (extra day for previous close)
-        if df is None or df.empty or len(df) < window_size + 1:
-            continue
-            
-        # Convert date column to datetime for proper sorting if needed
-        df_copy = df.copy()
-        if not pd.api.types.is_datetime64_any_dtype(df_copy['Date']):
-            df_copy['Date'] = pd.to_datetime(df_copy['Date'])
-        
-        df_sorted = df_copy.sort_values("Date", ascending=True)
-        
-        # Convert DataFrame to list of candle dictionaries
-        candles = []
-        for _, row in df_sorted.iterrows():
-            candles.append({
-                'open': row['Open'],
-                'close': row['Close'],
-                'high': row['High'],
-                'low': row['Low']
-            })
-        
-        # Calculate days from longest candle with specified window
-        # We need window_size + 1 days for proper previous close reference
-        actual_window = min(window_size, len(df_sorted) - 1)
-        
-        # Get the extended window data (window_size + 1 days)
-        df_extended_window = df_sorted.iloc[-(actual_window + 1):]
-        
-        days_from_longest = calculate_days_from_longest_candle(df_extended_window)
-        
-        # Support factor: days from longest candle (more distant longest candle = better support)
-        # Normalize to 0-1 range, where farther from recent = higher score
-        support_factor_base = (days_from_longest / (actual_window - 1)) if actual_window > 1 else 0
-        
-        # Get the window for price ratio calculation
-        window = candles[-actual_window:]
-        
-        # For support factor, higher values when price declined from window start
-
-        # Calculate price ratio: (Prev Open - Prev Close)/(Prev Low - Curr Low) scaled
-        if len(window) >= 2:
-            yesterday = window[-2]
-            today = window[-1]
-            yesterday_open = yesterday['open']
-            yesterday_close = yesterday['close']
-            yesterday_low = yesterday['low']
-            today_low = today['low']
-            
-            denominator = yesterday_low - today_low
-            if denominator != 0:
-                price_ratio = (yesterday_open - yesterday_close) * 2 / denominator
-            else:
-                price_ratio = 1.0
-        else:
-            price_ratio = 1.0
-        
-        # Combine time factor with price movement; higher suggests stronger support
-        support_factor = support_factor_base * price_ratio
-        
-        normalized = 1 / (1 + np.exp(-support_factor))
+    frames = [df for _, df in eligible]
+    starts, (open_values, close_values, low_values) = concat_columns(frames, 'Open', 'Close', 'Low')
+    ends = starts + np.fromiter((len(df) for df in frames), dtype=np.int64, count=len(frames))
+    
+    # Every eligible symbol has at least window_size + 1 days, so all windows have the same length
+    # and the whole factor is computed on (symbols, window_size + 1) arrays gathered from the tail of
+    # each frame. The extended window (window_size + 1 days) starts with the previous close reference candle.
+    span = window_size + 1
+    window = ends[:, None] - span + np.arange(span)
+    opens = open_values[window]
+    closes = close_values[window]
+    lows = low_values[window]
+    
+    days_from_longest = calculate_days_from_longest_candle(opens[:, 1:], closes[:, 1:], closes[:, 0])
+    
+    # Support factor: days from longest candle (more distant longest candle = better support)
+    # Normalize to 0-1 range, where farther from recent = higher score
+    if window_size > 1:
+        support_factor_base = days_from_longest / (window_size - 1)
+    else:
+        support_factor_base = np.zeros(len(eligible))
+    
+    # For support factor, higher values when price declined from window start
 
-        rows.append({
-            "Symbol": code, 
-            "Support": support_factor,
-            "Support Score": normalized,
-            f"Days From Longest Candle_{window_size}": days_from_longest,
-        })
+    # Calculate price ratio: (Prev Open - Prev Close)/(Prev Low - Curr Low) scaled
+    if window_size >= 2:
+        denominator = lows[:, -2] - lows[:, -1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            price_ratio = np.where(
+                denominator != 0, (opens[:, -2] - closes[:, -2]) * 2 / denominator, 1.0
+            )
+    else:
+        price_ratio = np.ones(len(eligible))
     
-    return pd.DataFrame(rows)
+    # Combine time factor with price movement; higher suggests stronger support
+    support_factor = support_factor_base * price_ratio
+    
+    normalized = 1 / (1 + np.exp(-support_factor))
+
+    return pd.DataFrame({
+        "Symbol": [code for code, _ in eligible],
+        "Support": support_factor,
+        "Support Score": normalized,
+        f"Days From Longest Candle_{window_size}": days_from_longest,
+    })
 
 
 # Configuration
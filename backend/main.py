@@ -2,11 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 import os
 
 from database.connection import engine, Base, SessionLocal
-from database.models import TradingConfig, User, SystemConfig
+from database.models import TradingConfig, User, SystemConfig, Trade
 from config.settings import DEFAULT_TRADING_CONFIGS
 app = FastAPI(title="Simulated US Stocks Trading API")
 
@@ -36,25 +37,33 @@ if os.path.exists(static_dir):
 def on_startup():
     # Create tables
     Base.metadata.create_all(bind=engine)
+    # create_all 不会为已存在的表补建索引
+    for index in Trade.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
     # Seed trading configs if empty
     db: Session = SessionLocal()
     try:
-        if db.query(TradingConfig).count() == 0:
-            for cfg in DEFAULT_TRADING_CONFIGS.values():
-                db.add(
-                    TradingConfig(
-                        version="v1",
-                        market=cfg.market,
-                        min_commission=cfg.min_commission,
-                        commission_rate=cfg.commission_rate,
-                        exchange_rate=cfg.exchange_rate,
-                        min_order_quantity=cfg.min_order_quantity,
-                        lot_size=cfg.lot_size,
-                    )
-                )
+        # 只需判断表是否为空，取一行即可，不做全表 count
+        if db.query(TradingConfig.id).first() is None:
+            # 所有默认配置一条 INSERT 语句批量写入
+            db.execute(
+                insert(TradingConfig),
+                [
+                    {
+                        "version": "v1",
+                        "market": cfg.market,
+                        "min_commission": cfg.min_commission,
+                        "commission_rate": cfg.commission_rate,
+                        "exchange_rate": cfg.exchange_rate,
+                        "min_order_quantity": cfg.min_order_quantity,
+                        "lot_size": cfg.lot_size,
+                    }
+                    for cfg in DEFAULT_TRADING_CONFIGS.values()
+                ],
+            )
             db.commit()
         # Ensure a demo user exists
-        if db.query(User).count() == 0:
+        if db.query(User.id).first() is None:
             demo = User(
                 version="v1",
                 username="demo",
@@ -67,9 +76,17 @@ def on_startup():
     finally:
         db.close()
     
+    # Load xueqiu cookie from database into the market data client
+    from services.startup import initialize_xueqiu_config
+    initialize_xueqiu_config()
+    
     # Start order scheduler
     from services.order_scheduler import start_order_scheduler
     start_order_scheduler()
+    
+    # 资产曲线快照由定时任务物化，读接口不写库
+    from services.scheduler import add_daily_asset_snapshot_job
+    add_daily_asset_snapshot_job()
 
 
 @app.on_event("shutdown")
@@ -77,6 +94,9 @@ def on_shutdown():
     # Stop order scheduler
     from services.order_scheduler import stop_order_scheduler
     stop_order_scheduler()
+    
+    from services.scheduler import stop_scheduler
+    stop_scheduler()
 
 
 # API routes
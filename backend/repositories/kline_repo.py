@@ -5,9 +5,11 @@ K线数据仓库模块
 
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List, Optional
 from database.models import StockKline
 from database.connection import get_db
+from services.cache import ranking_cache
 
 
 class KlineRepository:
@@ -27,25 +29,13 @@ class KlineRepository:
         Returns:
             保存结果字典，包含新增和更新的数量
         """
-        inserted_count = 0
-        updated_count = 0
-        
+        # 按时间戳去重（同一时间戳保留最后一条），跳过没有时间戳的数据
+        rows_by_timestamp = {}
         for item in kline_data:
             timestamp = item.get('timestamp')
             if not timestamp:
                 continue
-                
-            # 检查是否已存在相同时间戳的记录
-            existing = self.db.query(StockKline).filter(
-                and_(
-                    StockKline.symbol == symbol,
-                    StockKline.market == market,
-                    StockKline.period == period,
-                    StockKline.timestamp == timestamp
-                )
-            ).first()
-            
-            kline_data_dict = {
+            rows_by_timestamp[timestamp] = {
                 'symbol': symbol,
                 'market': market,
                 'period': period,
@@ -60,22 +50,40 @@ class KlineRepository:
                 'change': item.get('chg'),
                 'percent': item.get('percent')
             }
-            
-            if existing:
-                # 更新现有记录
-                for key, value in kline_data_dict.items():
-                    if key not in ['symbol', 'market', 'period', 'timestamp']:  # 不更新主键字段
-                        setattr(existing, key, value)
-                updated_count += 1
-            else:
-                # 插入新记录
-                kline_record = StockKline(**kline_data_dict)
-                self.db.add(kline_record)
-                inserted_count += 1
         
-        if inserted_count > 0 or updated_count > 0:
-            self.db.commit()
-            
+        if not rows_by_timestamp:
+            return {'inserted': 0, 'updated': 0, 'total': 0}
+        
+        # 一次查询已存在的时间戳，用于统计新增/更新数量
+        existing_timestamps = {
+            timestamp for (timestamp,) in self.db.query(StockKline.timestamp).filter(
+                and_(
+                    StockKline.symbol == symbol,
+                    StockKline.market == market,
+                    StockKline.period == period,
+                    StockKline.timestamp.in_(list(rows_by_timestamp))
+                )
+            )
+        }
+        
+        # 单条 INSERT ... ON CONFLICT DO UPDATE 批量写入，不更新唯一键字段
+        stmt = sqlite_insert(StockKline).values(list(rows_by_timestamp.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['symbol', 'market', 'period', 'timestamp'],
+            set_={
+                column: stmt.excluded[column]
+                for column in (
+                    'datetime_str', 'open_price', 'high_price', 'low_price', 'close_price',
+                    'volume', 'amount', 'change', 'percent'
+                )
+            },
+        )
+        self.db.execute(stmt)
+        self.db.commit()
+        ranking_cache.clear()
+        
+        updated_count = len(existing_timestamps)
+        inserted_count = len(rows_by_timestamp) - updated_count
         return {
             'inserted': inserted_count,
             'updated': updated_count,
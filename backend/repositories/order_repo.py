@@ -1,6 +1,8 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, raiseload
 from database.models import Order
-from typing import List, Optional
+from database.types import decimal_as_float
+from typing import Any, Dict, List, Optional
 
 
 def create_order(db: Session, order: Order) -> Order:
@@ -13,11 +15,37 @@ def create_order(db: Session, order: Order) -> Order:
 def list_orders(db: Session, user_id: int) -> List[Order]:
     return (
         db.query(Order)
+        .options(raiseload("*"))
         .filter(Order.user_id == user_id)
         .order_by(Order.created_at.desc())
         .all()
     )
 
 
+def list_order_rows(db: Session, user_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    """只读查询订单列（按创建时间倒序，可按状态过滤），直接返回字典"""
+    stmt = (
+        select(
+            Order.id,
+            Order.order_no,
+            Order.user_id,
+            Order.symbol,
+            Order.name,
+            Order.market,
+            Order.side,
+            Order.order_type,
+            decimal_as_float(Order.price).label("price"),
+            Order.quantity,
+            Order.filled_quantity,
+            Order.status,
+        )
+        .where(Order.user_id == user_id)
+        .order_by(Order.created_at.desc())
+    )
+    if status:
+        stmt = stmt.where(Order.status == status)
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+
 def get_order_by_no(db: Session, order_no: str) -> Optional[Order]:
     return db.query(Order).filter(Order.order_no == order_no).first()
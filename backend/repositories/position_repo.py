@@ -1,10 +1,27 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, raiseload
 from database.models import Position
-from typing import List, Optional
+from database.types import decimal_as_float
+from typing import Any, Dict, List, Optional
 
 
 def list_positions(db: Session, user_id: int) -> List[Position]:
-    return db.query(Position).filter(Position.user_id == user_id).all()
+    return db.query(Position).options(raiseload("*")).filter(Position.user_id == user_id).all()
+
+
+def list_position_rows(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """只读查询持仓列，直接返回字典，不构造 ORM 实例"""
+    stmt = select(
+        Position.id,
+        Position.user_id,
+        Position.symbol,
+        Position.name,
+        Position.market,
+        Position.quantity,
+        Position.available_quantity,
+        decimal_as_float(Position.avg_cost).label("avg_cost"),
+    ).where(Position.user_id == user_id)
+    return [dict(row) for row in db.execute(stmt).mappings()]
 
 
 def get_position(db: Session, user_id: int, symbol: str, market: str) -> Optional[Position]:
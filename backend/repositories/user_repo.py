@@ -1,6 +1,8 @@
+from sqlalchemy import select, case, func
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Optional, Tuple
 from database.models import User, UserAuthSession
+from services.cache import auth_session_cache
 from decimal import Decimal
 import hashlib
 import secrets
@@ -12,6 +14,7 @@ def get_or_create_user(
     username: str, 
     initial_capital: float = 100000.0
 ) -> User:
+    """Get a user by name or add a new one; new users are flushed (id assigned), the caller commits"""
     user = db.query(User).filter(User.username == username).first()
     if user:
         return user
@@ -23,8 +26,7 @@ def get_or_create_user(
         frozen_cash=0.0,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    db.flush()
     return user
 
 
@@ -32,6 +34,17 @@ def get_user(db: Session, user_id: int) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
 
+def get_user_with_password_flag(db: Session, user_id: int) -> Tuple[Optional[User], bool]:
+    """Load user and whether a trading password is set in a single query"""
+    has_password = case(
+        (func.trim(func.coalesce(User.password, "")) != "", True), else_=False
+    ).label("has_password")
+    row = db.execute(select(User, has_password).where(User.id == user_id)).first()
+    if row is None:
+        return None, False
+    return row[0], bool(row[1])
+
+
 def update_user_cash(
     db: Session, 
     user_id: int, 
@@ -48,7 +61,6 @@ def update_user_cash(
         user.frozen_cash = frozen_cash
     
     db.commit()
-    db.refresh(user)
     return user
 
 
@@ -111,12 +123,24 @@ def create_auth_session(db: Session, user_id: int) -> Optional[UserAuthSession]:
 
 def verify_auth_session(db: Session, session_token: str) -> Optional[int]:
     """Verify session token and return user_id if valid"""
+    now = datetime.datetime.utcnow()
+    cached = auth_session_cache.get(session_token)
+    if cached is not None:
+        user_id, expires_at = cached
+        if expires_at > now:
+            return user_id
+        auth_session_cache.pop(session_token)
+        return None
+    
     session = db.query(UserAuthSession).filter(
         UserAuthSession.session_token == session_token,
-        UserAuthSession.expires_at > datetime.datetime.utcnow()
+        UserAuthSession.expires_at > now
     ).first()
     
-    return session.user_id if session else None
+    if not session:
+        return None
+    auth_session_cache.set(session_token, (session.user_id, session.expires_at))
+    return session.user_id
 
 
 def cleanup_expired_sessions(db: Session, user_id: int = None) -> int:
@@ -137,6 +161,7 @@ def cleanup_expired_sessions(db: Session, user_id: int = None) -> int:
 
 def revoke_auth_session(db: Session, session_token: str) -> bool:
     """Revoke a specific session token"""
+    auth_session_cache.pop(session_token)
     session = db.query(UserAuthSession).filter(
         UserAuthSession.session_token == session_token
     ).first()
@@ -151,9 +176,14 @@ def revoke_auth_session(db: Session, session_token: str) -> bool:
 
 def revoke_all_user_sessions(db: Session, user_id: int) -> int:
     """Revoke all sessions for a user"""
-    deleted_count = db.query(UserAuthSession).filter(
-        UserAuthSession.user_id == user_id
-    ).count()
+    tokens = [
+        token for (token,) in db.query(UserAuthSession.session_token).filter(
+            UserAuthSession.user_id == user_id
+        )
+    ]
+    for token in tokens:
+        auth_session_cache.pop(token)
+    deleted_count = len(tokens)
     
     db.query(UserAuthSession).filter(
         UserAuthSession.user_id == user_id
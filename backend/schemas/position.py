@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class PositionOut(BaseModel):
@@ -11,5 +11,4 @@ class PositionOut(BaseModel):
     available_quantity: int
     avg_cost: float
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
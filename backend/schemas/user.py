@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 
 
@@ -15,8 +15,7 @@ class UserOut(BaseModel):
     frozen_cash: float
     has_password: bool = False  # Indicates if user has set a trading password
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class PasswordSetRequest(BaseModel):
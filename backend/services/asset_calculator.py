@@ -1,4 +1,5 @@
 from decimal import Decimal
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from database.models import Position
 from .market_data import get_last_price
@@ -15,18 +16,24 @@ def calc_positions_value(db: Session, user_id: int) -> float:
     Returns:
         持仓总市值，如果无法获取价格则返回0
     """
-    positions = db.query(Position).filter(Position.user_id == user_id).all()
+    # 在数据库中按股票汇总持仓数量，每个股票只取一次实时价格，空仓不取价
+    holdings = (
+        db.query(Position.symbol, Position.market, func.sum(Position.quantity).label("quantity"))
+        .filter(Position.user_id == user_id, Position.quantity > 0)
+        .group_by(Position.symbol, Position.market)
+        .all()
+    )
     total = Decimal("0")
     
-    for p in positions:
+    for symbol, market, quantity in holdings:
         try:
-            price = Decimal(str(get_last_price(p.symbol, p.market)))
-            total += price * Decimal(p.quantity)
+            price = Decimal(str(get_last_price(symbol, market)))
+            total += price * Decimal(quantity)
         except Exception as e:
             # 记录错误但不中断计算，当无法获取价格时跳过该持仓
             import logging
             logger = logging.getLogger(__name__)
-            logger.warning(f"无法获取 {p.symbol}.{p.market} 价格，跳过该持仓价值计算: {e}")
+            logger.warning(f"无法获取 {symbol}.{market} 价格，跳过该持仓价值计算: {e}")
             continue
     
     return float(total)
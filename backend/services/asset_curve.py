@@ -0,0 +1,353 @@
+"""
+资产曲线服务
+按成交与历史价格逐日计算用户资产曲线；已结束日期的点由定时任务物化到每日快照表，
+成交或价格写入时删除受影响日期起的快照
+"""
+
+from sqlalchemy import event, delete, func, and_, case, select, union, tuple_, type_coerce, bindparam, inspect, Date, Float
+from sqlalchemy.orm import Session
+from typing import Optional, List, Dict, Any, Tuple, Set, Iterator
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain
+import logging
+import threading
+
+from database.connection import SessionFactory
+from database.models import User, Trade, StockPrice, UserDailySnapshot
+from database.types import decimal_as_float
+
+logger = logging.getLogger(__name__)
+
+# 读取价格历史时每批的行数
+_PRICE_ROWS_BATCH = 1000
+
+# 查询语句在模块加载时构建一次，请求时只绑定参数
+_TRADE_DAY = type_coerce(func.date(Trade.trade_time), Date).label("trade_day")
+_TRADE_AMOUNT = Trade.price * Trade.quantity + Trade.commission
+_TRADE_DELTAS_STMT = select(
+    _TRADE_DAY,
+    Trade.symbol,
+    Trade.market,
+    type_coerce(func.sum(case((Trade.side == "BUY", -_TRADE_AMOUNT), else_=_TRADE_AMOUNT)), Float).label("cash_delta"),
+    func.sum(case((Trade.side == "BUY", Trade.quantity), else_=-Trade.quantity)).label("qty_delta"),
+).where(
+    Trade.user_id == bindparam("user_id")
+).group_by(_TRADE_DAY, Trade.symbol, Trade.market).order_by(_TRADE_DAY)
+
+_SNAPSHOTS_STMT = select(
+    UserDailySnapshot.snapshot_date,
+    UserDailySnapshot.total_assets,
+    UserDailySnapshot.cash,
+    UserDailySnapshot.positions_value,
+).where(
+    UserDailySnapshot.user_id == bindparam("user_id")
+).order_by(UserDailySnapshot.snapshot_date.asc())
+
+# 有成交或有价格数据的日期（UNION 去重）
+_CURVE_DATES = union(
+    select(type_coerce(func.date(Trade.trade_time), Date).label("d")).where(Trade.user_id == bindparam("user_id")),
+    select(StockPrice.price_date.label("d")),
+).subquery()
+_CURVE_DATES_STMT = select(_CURVE_DATES.c.d).where(
+    _CURVE_DATES.c.d >= bindparam("start_date", type_=Date)
+).order_by(_CURVE_DATES.c.d)
+
+_PRICE_COLUMNS = (StockPrice.symbol, StockPrice.market, StockPrice.price_date, decimal_as_float(StockPrice.price))
+_PRICE_PAIRS = tuple_(StockPrice.symbol, StockPrice.market).in_(bindparam("pairs", expanding=True))
+_PRICE_ROWS_STMT = select(*_PRICE_COLUMNS).where(
+    _PRICE_PAIRS,
+    StockPrice.price_date > bindparam("after", type_=Date),
+).order_by(StockPrice.price_date.asc()).execution_options(yield_per=_PRICE_ROWS_BATCH)
+
+# 每个股票截至 after（含）的最新价格
+_LATEST_PRICE_DATES = select(
+    StockPrice.symbol, StockPrice.market, func.max(StockPrice.price_date).label("price_date")
+).where(
+    _PRICE_PAIRS,
+    StockPrice.price_date <= bindparam("after", type_=Date),
+).group_by(StockPrice.symbol, StockPrice.market).subquery()
+_LATEST_PRICES_STMT = select(*_PRICE_COLUMNS).join(
+    _LATEST_PRICE_DATES,
+    and_(
+        StockPrice.symbol == _LATEST_PRICE_DATES.c.symbol,
+        StockPrice.market == _LATEST_PRICE_DATES.c.market,
+        StockPrice.price_date == _LATEST_PRICE_DATES.c.price_date,
+    ),
+)
+
+
+def snapshot_cutoff_date() -> date:
+    """快照只保存此日期之前的点
+
+    成交日期取自 SQLite CURRENT_TIMESTAMP（UTC），价格日期按本机日期写入，取两个时钟中较早的"今天"
+    """
+    return min(date.today(), datetime.now(timezone.utc).date())
+
+
+def _compute_curve(
+    db: Session, user_id: int, initial_capital: float
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """返回 (按日期/股票聚合的成交, 已物化的快照点, 最后一个快照之后逐日计算的点)"""
+    # 在数据库中按 日期/股票 聚合成交的现金变化与数量变化，后续按日期单次扫描累加
+    trade_deltas = _load_daily_trade_deltas(db, user_id)
+    if not trade_deltas:
+        return trade_deltas, [], []
+    
+    # 已结束的日期已物化到快照表，只需计算最后一个快照之后的日期
+    snapshot_points = _load_snapshot_points(db, user_id)
+    last_snapshot_date = date.fromisoformat(snapshot_points[-1]["date"]) if snapshot_points else None
+    
+    # 只取第一笔成交日期（或最后一个快照之后）起有成交或价格数据的日期
+    start_date = last_snapshot_date + timedelta(days=1) if last_snapshot_date else trade_deltas[0]["date"]
+    relevant_dates = db.execute(
+        _CURVE_DATES_STMT, {"user_id": user_id, "start_date": start_date}
+    ).scalars().all()
+    
+    # 一次性预加载成交涉及股票的历史价格，按日期升序，与成交同步推进
+    price_rows = _load_price_rows(
+        db, {(delta["symbol"], delta["market"]) for delta in trade_deltas}, after=last_snapshot_date
+    )
+    
+    new_points = list(_iter_curve_points(initial_capital, trade_deltas, relevant_dates, price_rows))
+    return trade_deltas, snapshot_points, new_points
+
+
+def load_asset_curve(db: Session, user_id: int, initial_capital: float) -> Optional[Tuple[date, List[Dict[str, Any]]]]:
+    """读取资产曲线（只读，不写快照），返回 (第一笔成交日期, 曲线点)；没有成交时返回 None"""
+    trade_deltas, snapshot_points, new_points = _compute_curve(db, user_id, initial_capital)
+    if not trade_deltas:
+        return None
+    return trade_deltas[0]["date"], snapshot_points + new_points
+
+
+# 快照失效计数：成交/价格写入删除快照时递增，物化任务据此判断计算期间数据是否被修改
+_invalidations = 0
+_invalidations_lock = threading.Lock()
+
+
+def _invalidation_count() -> int:
+    with _invalidations_lock:
+        return _invalidations
+
+
+def materialize_daily_snapshots(db: Session) -> int:
+    """为所有有成交的用户补齐截止日期之前的快照，返回写入的快照数"""
+    cutoff = snapshot_cutoff_date().isoformat()
+    users = db.execute(
+        select(User.id, decimal_as_float(User.initial_capital)).where(User.id.in_(select(Trade.user_id)))
+    ).all()
+    saved = 0
+    for user_id, initial_capital in users:
+        invalidations = _invalidation_count()
+        try:
+            _, _, new_points = _compute_curve(db, user_id, initial_capital)
+            snapshots = [
+                UserDailySnapshot(
+                    user_id=user_id,
+                    snapshot_date=date.fromisoformat(point["date"]),
+                    cash=point["cash"],
+                    positions_value=point["positions_value"],
+                    total_assets=point["total_assets"],
+                )
+                for point in new_points
+                if point["date"] < cutoff
+            ]
+            if not snapshots:
+                continue
+            db.add_all(snapshots)
+            db.flush()
+            # SQLite 同一时间只有一个写事务：flush 返回时先前的失效删除已执行完毕，
+            # 此时计数变化说明本次读到的成交/价格可能已过期，放弃写入，下次任务重算
+            if _invalidation_count() != invalidations:
+                db.rollback()
+                continue
+            db.commit()
+            saved += len(snapshots)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"物化用户 {user_id} 资产快照失败: {e}")
+    return saved
+
+
+def run_daily_snapshot_job():
+    """定时任务入口：使用独立会话物化资产快照"""
+    db = SessionFactory()
+    try:
+        saved = materialize_daily_snapshots(db)
+        if saved:
+            logger.info(f"已写入 {saved} 条用户资产快照")
+    except Exception as e:
+        logger.error(f"资产快照任务失败: {e}")
+    finally:
+        db.close()
+
+
+def _earliest_date(obj, attr: str, default: date) -> date:
+    """对象日期字段修改前后的最早日期；字段未加载时返回 default"""
+    history = inspect(obj).attrs[attr].history
+    values = [value for value in chain(history.added, history.unchanged, history.deleted) if value is not None]
+    if not values:
+        return default
+    return min(value.date() if isinstance(value, datetime) else value for value in values)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_daily_snapshots(session: Session, flush_context):
+    """成交或价格写入时，在同一事务中删除受影响日期起的快照"""
+    user_dates: Dict[int, date] = {}
+    # 价格影响所有持有该股票的用户，按日期删除所有用户的快照
+    all_users_date: Optional[date] = None
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Trade):
+            # 新成交未指定成交时间时由数据库按 UTC 当前时间填充
+            default = datetime.now(timezone.utc).date() if obj in session.new else date.min
+            day = _earliest_date(obj, "trade_time", default)
+            # 只读已加载的字段，已删除的行不能再刷新属性
+            user_id = inspect(obj).dict.get("user_id")
+            if user_id is not None:
+                user_dates[user_id] = min(day, user_dates.get(user_id, day))
+                continue
+        elif isinstance(obj, StockPrice):
+            day = _earliest_date(obj, "price_date", date.min)
+        else:
+            continue
+        all_users_date = day if all_users_date is None else min(all_users_date, day)
+    if not user_dates and all_users_date is None:
+        return
+    
+    global _invalidations
+    with _invalidations_lock:
+        _invalidations += 1
+    
+    snapshots = UserDailySnapshot.__table__
+    connection = session.connection()
+    if all_users_date is not None:
+        connection.execute(delete(snapshots).where(snapshots.c.snapshot_date >= all_users_date))
+    for user_id, day in user_dates.items():
+        connection.execute(
+            delete(snapshots).where(snapshots.c.user_id == user_id, snapshots.c.snapshot_date >= day)
+        )
+
+
+def _iter_curve_points(
+    initial_capital: float,
+    trade_deltas: List[Dict[str, Any]],
+    relevant_dates: List[date],
+    price_rows: List[Tuple[date, Tuple[str, str], float]],
+) -> Iterator[Dict[str, Any]]:
+    """逐日生成资产曲线点，只使用已加载的数据，不访问数据库
+    
+    成交按全部历史累加；price_rows 需包含第一个日期之前各股票的最新价格作为起点
+    """
+    # 累计状态：现金变化、每个股票的净持仓与最新价格，随日期推进只处理当日新增的成交与报价
+    cash_changes = 0.0
+    position_quantities: Dict[Tuple[str, str], int] = {}
+    last_prices: Dict[Tuple[str, str], float] = {}
+    delta_index = 0
+    price_index = 0
+    positions_value = 0.0
+    
+    for target_date in relevant_dates:
+        try:
+            # 累加到该日期为止的成交（前缀和）
+            changed = False
+            while delta_index < len(trade_deltas) and trade_deltas[delta_index]["date"] <= target_date:
+                delta = trade_deltas[delta_index]
+                key = (delta["symbol"], delta["market"])
+                position_quantities[key] = position_quantities.get(key, 0) + delta["qty_delta"]
+                cash_changes += delta["cash_delta"]
+                delta_index += 1
+                changed = True
+            current_cash = initial_capital + cash_changes
+            
+            # 更新到该日期为止各股票的最新价格
+            while price_index < len(price_rows) and price_rows[price_index][0] <= target_date:
+                _, key, price = price_rows[price_index]
+                last_prices[key] = price
+                price_index += 1
+                changed = True
+            
+            # 持仓与价格均未变化时沿用上一日的持仓价值
+            if changed:
+                positions_value = _calculate_positions_value_on_date(last_prices, position_quantities, target_date)
+            
+            total_assets = current_cash + positions_value
+        except Exception as e:
+            logger.warning(f"计算日期 {target_date} 的资产失败: {e}")
+            continue
+        
+        yield {
+            "date": target_date.isoformat(),
+            "total_assets": total_assets,
+            "cash": current_cash,
+            "positions_value": positions_value,
+            "is_initial": False
+        }
+
+
+def _load_daily_trade_deltas(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """按 日期/股票 聚合用户成交，返回每组的现金变化（买入为负，卖出为正）与数量变化，日期升序"""
+    deltas = []
+    for row in db.execute(_TRADE_DELTAS_STMT, {"user_id": user_id}):
+        deltas.append({
+            "date": row.trade_day,
+            "symbol": row.symbol,
+            "market": row.market,
+            "cash_delta": row.cash_delta,
+            "qty_delta": int(row.qty_delta),
+        })
+    return deltas
+
+
+def _load_price_rows(
+    db: Session, pairs: Set[Tuple[str, str]], after: Optional[date] = None
+) -> List[Tuple[date, Tuple[str, str], float]]:
+    """
+    按 (symbol, market) 加载指定股票的历史价格，返回 (日期, (symbol, market), 价格) 列表，日期升序
+    指定 after 时只加载该日期之后的价格，另加每个股票截至 after 的最新一条作为起点
+    """
+    params = {"pairs": list(pairs), "after": after or date.min}
+    stmts = [_LATEST_PRICES_STMT, _PRICE_ROWS_STMT] if after is not None else [_PRICE_ROWS_STMT]
+    
+    # 分批读取，避免一次性物化全部 Row 对象
+    price_rows = []
+    for stmt in stmts:
+        for partition in db.execute(stmt, params).partitions():
+            price_rows.extend((price_date, (symbol, market), price) for symbol, market, price_date, price in partition)
+    return price_rows
+
+
+def _load_snapshot_points(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """读取已物化的每日资产快照，日期升序"""
+    rows = db.execute(_SNAPSHOTS_STMT, {"user_id": user_id})
+    return [
+        {
+            "date": snapshot_date.isoformat(),
+            "total_assets": total_assets,
+            "cash": cash,
+            "positions_value": positions_value,
+            "is_initial": False
+        }
+        for snapshot_date, total_assets, cash, positions_value in rows
+    ]
+
+
+def _calculate_positions_value_on_date(
+    last_prices: Dict[Tuple[str, str], float],
+    position_quantities: Dict[Tuple[str, str], int],
+    target_date: date,
+) -> float:
+    """根据净持仓与截至指定日期的最新价格计算持仓价值"""
+    total_value = 0.0
+    for key, quantity in position_quantities.items():
+        if quantity <= 0:
+            continue
+        
+        price = last_prices.get(key)
+        if price is not None:
+            position_value = price * quantity
+            total_value += position_value
+        else:
+            logger.warning(f"未找到 {key[0]} 在 {target_date} 的价格数据")
+    
+    return total_value
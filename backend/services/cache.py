@@ -0,0 +1,110 @@
+"""
+进程内缓存服务
+提供带过期时间的线程安全缓存，用于热点读接口的 cache-aside
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """带过期时间的线程安全缓存"""
+
+    def __init__(self, ttl: float, maxsize: Optional[int] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires_at, value)
+            if self.maxsize is not None and len(self._data) > self.maxsize:
+                self._evict()
+
+    def _evict(self) -> None:
+        """超出容量时先清理过期项，仍超出则按写入顺序淘汰最旧的项"""
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+        while len(self._data) > self.maxsize:
+            del self._data[next(iter(self._data))]
+
+    def pop(self, key: Hashable) -> None:
+        """删除缓存项（写路径上用于失效）"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """
+        读取缓存，未命中时调用 factory 计算并写入
+        同一 key 的并发未命中只会计算一次，其余调用等待结果（防止缓存击穿）
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        try:
+            with key_lock:
+                value = self.get(key, _MISSING)
+                if value is _MISSING:
+                    value = factory()
+                    self.set(key, value, ttl)
+        finally:
+            with self._lock:
+                if not key_lock.locked():
+                    self._key_locks.pop(key, None)
+        return value
+
+
+# 账户概览缓存：余额只在下单/成交/撤单时变化，写路径上主动失效
+overview_cache = TTLCache(ttl=3)
+
+# 认证会话缓存：session_token -> (user_id, expires_at)，注销时主动失效
+auth_session_cache = TTLCache(ttl=60, maxsize=10_000)
+
+# 雪球 cookie 配置缓存：只在配置接口更新时变化
+xueqiu_cookie_cache = TTLCache(ttl=60)
+
+# 行情缓存：相同股票在短时间内只访问一次上游数据源（get_last_price 内部使用）
+price_cache = TTLCache(ttl=5, maxsize=10_000)
+# K线接口缓存：按 (symbol, market, period, count) 缓存编码后的响应体
+kline_cache = TTLCache(ttl=60)
+# 休市行情缓存：只供快照/广播批量取价使用，过期时间不超过下次开盘；下单撮合只读上面的短期缓存
+closed_market_price_cache = TTLCache(ttl=600, maxsize=10_000)
+
+# 快照数据缓存：user_id -> (账户, 持仓, 订单) 行，提交涉及该用户的写入时主动失效
+snapshot_rows_cache = TTLCache(ttl=30, maxsize=10_000)
+
+# 最近成交缓存：user_id -> 最近成交行（新的在前），有新成交时只增量查询新增的行
+recent_trades_cache = TTLCache(ttl=600, maxsize=10_000)
+
+# 因子排行表缓存：按参数缓存编码后的响应，K线数据写入时主动失效
+ranking_cache = TTLCache(ttl=300, maxsize=512)
+
+# 公司基本信息缓存：公司资料最多按天变化，只缓存获取成功的结果
+stock_info_cache = TTLCache(ttl=24 * 3600, maxsize=5000)
@@ -2,6 +2,14 @@
 雪球Cookie获取帮助工具
 """
 
+import re
+
+# 一次扫描取出所有 key=value 片段（按 ; 分隔，值中可以含 =），不再逐段 split
+_COOKIE_RE = re.compile(r"([^;=]*)=([^;]*)")
+
+# 验证时必须存在且非空的cookie
+_REQUIRED_COOKIES = ('xq_a_token', 'xqat', 'u', 'device_id')
+
 def get_required_cookies():
     """返回雪球API所需的关键cookie列表"""
     return [
@@ -38,22 +46,11 @@ def validate_cookie_string(cookie_string: str) -> dict:
         }
     
     # 解析cookie
-    cookies = {}
-    for cookie in cookie_string.split(';'):
-        if '=' in cookie:
-            key, value = cookie.split('=', 1)
-            cookies[key.strip()] = value.strip()
+    cookies = {key.strip(): value.strip() for key, value in _COOKIE_RE.findall(cookie_string)}
     
     # 检查必需的cookie
-    required = ['xq_a_token', 'xqat', 'u', 'device_id']
-    missing = []
-    present = []
-    
-    for req in required:
-        if req in cookies and cookies[req]:
-            present.append(req)
-        else:
-            missing.append(req)
+    present = [req for req in _REQUIRED_COOKIES if cookies.get(req)]
+    missing = [req for req in _REQUIRED_COOKIES if not cookies.get(req)]
     
     is_valid = len(missing) == 0
     
@@ -1,4 +1,7 @@
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import logging
 from .yfinance_market_data import (
     get_last_price_from_yfinance,
@@ -12,6 +15,8 @@ from .xueqiu_market_data import (
     get_xueqiu_cookie,
 )
 
+from .cache import closed_market_price_cache, price_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,7 +25,51 @@ def _check_xueqiu_cookie_available() -> bool:
     return bool(cookie and cookie.strip())
 
 
+try:
+    _US_EASTERN = ZoneInfo("America/New_York")
+except ZoneInfoNotFoundError:
+    # 系统没有时区数据时按美东标准时间估算
+    _US_EASTERN = timezone(timedelta(hours=-5))
+
+# 美股交易时段（美东时间，含盘前盘后），其余时间价格不会变化
+_US_SESSION_START = time(4, 0)
+_US_SESSION_END = time(20, 0)
+# 休市期间快照行情缓存时间上限（秒）
+_CLOSED_MARKET_PRICE_TTL = 600
+
+
+def us_market_is_open(now: Optional[datetime] = None) -> bool:
+    """美股当前是否处于交易时段（工作日 4:00-20:00 美东时间，不考虑节假日）"""
+    now = (now or datetime.now(timezone.utc)).astimezone(_US_EASTERN)
+    return now.weekday() < 5 and _US_SESSION_START <= now.time() < _US_SESSION_END
+
+
+def _seconds_until_session_start(now: datetime) -> float:
+    """距下一个交易时段开始的秒数（跳过周末）"""
+    now = now.astimezone(_US_EASTERN)
+    day = now.date()
+    if now.weekday() >= 5 or now.time() >= _US_SESSION_START:
+        day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    start = datetime.combine(day, _US_SESSION_START, tzinfo=_US_EASTERN)
+    return (start - now).total_seconds()
+
+
+def _closed_market_price_ttl(now: Optional[datetime] = None) -> Optional[float]:
+    """休市时快照行情的缓存时间，不超过下次开盘；交易时段内返回 None"""
+    now = now or datetime.now(timezone.utc)
+    if us_market_is_open(now):
+        return None
+    return min(_CLOSED_MARKET_PRICE_TTL, _seconds_until_session_start(now))
+
+
 def get_last_price(symbol: str, market: str) -> float:
+    """获取最新价格，5秒内的重复请求直接使用缓存，同一股票的并发未命中只请求一次上游"""
+    return price_cache.get_or_set((symbol, market), lambda: _fetch_last_price(symbol, market))
+
+
+def _fetch_last_price(symbol: str, market: str) -> float:
     key = f"{symbol}.{market}"
     logger.info(f"正在获取 {key} 的实时价格...")
 
@@ -44,6 +93,71 @@ def get_last_price(symbol: str, market: str) -> float:
         raise Exception(f"无法获取 {key} 的实时价格: {yf_err}")
 
 
+# 批量取价时并发访问上游的线程数
+_PRICE_FETCH_WORKERS = 8
+# 雪球批量行情接口单次请求的股票数
+_XUEQIU_BATCH_SIZE = 50
+_price_executor = ThreadPoolExecutor(max_workers=_PRICE_FETCH_WORKERS, thread_name_prefix="price")
+
+
+def get_last_prices(
+    symbols: Iterable[Tuple[str, str]],
+) -> Tuple[Dict[Tuple[str, str], float], Dict[Tuple[str, str], Exception]]:
+    """
+    批量获取多个股票的最新价格（快照/广播使用），重复的 (symbol, market) 只获取一次
+    未命中缓存的股票先用雪球批量接口一次请求获取，仍未取到的再逐个并发请求（含 yfinance 兜底）
+    休市时价格不变，额外读写休市行情缓存，广播基本不再访问上游
+
+    Returns:
+        (价格字典, 失败原因字典)，键均为 (symbol, market)
+    """
+    keys = list(dict.fromkeys(symbols))
+    prices: Dict[Tuple[str, str], float] = {}
+    errors: Dict[Tuple[str, str], Exception] = {}
+    if not keys:
+        return prices, errors
+
+    closed_ttl = _closed_market_price_ttl()
+    missing = []
+    for key in keys:
+        price = price_cache.get(key)
+        if price is None and closed_ttl is not None:
+            price = closed_market_price_cache.get(key)
+        if price is None:
+            missing.append(key)
+        else:
+            prices[key] = price
+    if missing and _check_xueqiu_cookie_available():
+        for start in range(0, len(missing), _XUEQIU_BATCH_SIZE):
+            batch = missing[start:start + _XUEQIU_BATCH_SIZE]
+            quoted = xueqiu_client.get_latest_prices(list(dict.fromkeys(symbol for symbol, _ in batch)))
+            for key in batch:
+                price = quoted.get(key[0])
+                if price is not None:
+                    prices[key] = price
+                    price_cache.set(key, price)
+                    if closed_ttl is not None:
+                        closed_market_price_cache.set(key, price, closed_ttl)
+    keys = [key for key in missing if key not in prices]
+    if not keys:
+        return prices, errors
+
+    def fetch(key: Tuple[str, str]):
+        try:
+            return get_last_price(*key), None
+        except Exception as e:
+            return None, e
+
+    for key, (price, error) in zip(keys, _price_executor.map(fetch, keys)):
+        if error is None:
+            prices[key] = price
+            if closed_ttl is not None:
+                closed_market_price_cache.set(key, price, closed_ttl)
+        else:
+            errors[key] = error
+    return prices, errors
+
+
 def get_kline_data(symbol: str, market: str, period: str = "1d", count: int = 100) -> List[Dict[str, Any]]:
     key = f"{symbol}.{market}"
 
@@ -5,10 +5,13 @@ from database.models import Order, Position, Trade, User, US_MIN_COMMISSION, US_
 from .market_data import get_last_price
 
 
+# Commission constants converted to Decimal once at import
+_COMMISSION_RATE = Decimal(str(US_COMMISSION_RATE))
+_MIN_COMMISSION = Decimal(str(US_MIN_COMMISSION))
+
+
 def _calc_commission(notional: Decimal) -> Decimal:
-    pct_fee = notional * Decimal(str(US_COMMISSION_RATE))
-    min_fee = Decimal(str(US_MIN_COMMISSION))
-    return max(pct_fee, min_fee)
+    return max(notional * _COMMISSION_RATE, _MIN_COMMISSION)
 
 def place_and_execute(db: Session, user: User, symbol: str, name: str, market: str, side: str, order_type: str, price: float | None, quantity: int) -> Order:
     # Only support US market
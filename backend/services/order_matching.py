@@ -11,15 +11,19 @@ import logging
 
 from database.models import Order, Position, Trade, User, US_MIN_COMMISSION, US_COMMISSION_RATE, US_MIN_ORDER_QUANTITY, US_LOT_SIZE
 from .market_data import get_last_price
+from .cache import overview_cache
 
 logger = logging.getLogger(__name__)
 
 
+# 佣金参数是模块常量，导入时转换一次 Decimal，不必每笔订单重复转换
+_COMMISSION_RATE = Decimal(str(US_COMMISSION_RATE))
+_MIN_COMMISSION = Decimal(str(US_MIN_COMMISSION))
+
+
 def _calc_commission(notional: Decimal) -> Decimal:
     """计算佣金"""
-    pct_fee = notional * Decimal(str(US_COMMISSION_RATE))
-    min_fee = Decimal(str(US_MIN_COMMISSION))
-    return max(pct_fee, min_fee)
+    return max(notional * _COMMISSION_RATE, _MIN_COMMISSION)
 
 
 def create_order(db: Session, user: User, symbol: str, name: str, market: str, 
@@ -297,6 +301,7 @@ def _execute_order(db: Session, order: Order, user: User, execution_price: Decim
         order.status = "FILLED"
         
         db.commit()
+        overview_cache.pop(user.id)
         
         logger.info(f"订单 {order.order_no} 成交: {order.side} {quantity} {order.symbol} @ ${execution_price}")
         return True
@@ -364,6 +369,7 @@ def cancel_order(db: Session, order: Order, reason: str = "用户取消") -> boo
         if user:
             _release_frozen_on_cancel(user, order)
         db.commit()
+        overview_cache.pop(order.user_id)
         
         logger.info(f"订单 {order.order_no} 已取消: {reason}")
         return True
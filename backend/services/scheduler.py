@@ -13,11 +13,17 @@ import asyncio
 import logging
 from datetime import date
 
-from database.connection import SessionLocal
+from database.connection import SessionFactory
 from database.models import Position, StockPrice
 
 logger = logging.getLogger(__name__)
 
+# 全局快照广播任务ID
+SNAPSHOT_BROADCAST_JOB_ID = "snapshot_broadcast"
+
+# 每日资产快照物化任务ID
+DAILY_ASSET_SNAPSHOT_JOB_ID = "daily_asset_snapshots"
+
 
 class TaskScheduler:
     """统一的任务调度器"""
@@ -46,52 +52,33 @@ class TaskScheduler:
         """检查调度器是否运行中"""
         return self._started and self.scheduler and self.scheduler.running
     
-    def add_user_snapshot_task(self, user_id: int, interval_seconds: int = 10):
+    def add_snapshot_broadcast_task(self, interval_seconds: int = 10):
         """
-        为用户添加快照更新任务
+        添加全局快照广播任务（所有在线用户共用一个任务）
         
         Args:
-            user_id: 用户ID
             interval_seconds: 更新间隔（秒），默认10秒
         """
         if not self.is_running():
             self.start()
             
-        job_id = f"snapshot_user_{user_id}"
-        
         # 检查任务是否已存在
-        if self.scheduler.get_job(job_id):
-            logger.debug(f"用户 {user_id} 的快照任务已存在")
+        if self.scheduler.get_job(SNAPSHOT_BROADCAST_JOB_ID):
             return
         
         self.scheduler.add_job(
-            func=self._execute_user_snapshot,
+            func=self._execute_snapshot_broadcast,
             trigger=IntervalTrigger(seconds=interval_seconds),
-            args=[user_id],
-            id=job_id,
+            id=SNAPSHOT_BROADCAST_JOB_ID,
             replace_existing=True,
             max_instances=1  # 避免重复执行
         )
         
-        logger.info(f"已为用户 {user_id} 添加快照任务，间隔 {interval_seconds} 秒")
+        logger.info(f"已添加快照广播任务，间隔 {interval_seconds} 秒")
     
-    def remove_user_snapshot_task(self, user_id: int):
-        """
-        移除用户的快照更新任务
-        
-        Args:
-            user_id: 用户ID
-        """
-        if not self.scheduler:
-            return
-            
-        job_id = f"snapshot_user_{user_id}"
-        
-        try:
-            self.scheduler.remove_job(job_id)
-            logger.info(f"已移除用户 {user_id} 的快照任务")
-        except Exception as e:
-            logger.debug(f"移除用户 {user_id} 快照任务失败: {e}")
+    def remove_snapshot_broadcast_task(self):
+        """移除全局快照广播任务"""
+        self.remove_task(SNAPSHOT_BROADCAST_JOB_ID)
     
     def add_market_hours_task(self, task_func: Callable, cron_expression: str, task_id: str):
         """
@@ -168,96 +155,93 @@ class TaskScheduler:
             })
         return jobs
     
-    async def _execute_user_snapshot(self, user_id: int):
+    async def _execute_snapshot_broadcast(self):
         """
-        执行用户快照更新的内部方法
-        
-        Args:
-            user_id: 用户ID
+        执行一轮快照广播：汇总所有在线用户的持仓，统一取一次价格，再逐个推送快照
         """
         try:
             # 动态导入避免循环依赖
             from api.ws import manager, _send_snapshot
+            from services.market_data import get_last_prices
             
-            # 检查用户是否还有活跃连接
-            if user_id not in manager.active_connections:
-                # 用户已断开连接，移除任务
-                self.remove_user_snapshot_task(user_id)
+            user_ids = list(manager.active_connections)
+            if not user_ids:
+                # 没有在线用户，移除任务，下次有用户连接时再添加
+                self.remove_snapshot_broadcast_task()
                 return
             
-            # 执行快照更新
-            db: Session = SessionLocal()
+            # 查询与写库在线程池中执行，会话会跨线程使用，不能用线程本地的 SessionLocal
+            db: Session = SessionFactory()
             try:
-                # 发送快照更新
-                await _send_snapshot(db, user_id)
+                # 所有在线用户的持仓股票去重后只取一次价格
+                holdings = await asyncio.to_thread(
+                    lambda: db.query(Position.symbol, Position.market).filter(
+                        Position.user_id.in_(user_ids),
+                        Position.quantity > 0
+                    ).distinct().all()
+                )
+                prices, price_errors = await asyncio.to_thread(
+                    get_last_prices, [tuple(h) for h in holdings]
+                )
+                
+                # 逐个推送：同一会话不能被多个线程同时使用；推送本身只是入队，不会互相等待
+                for uid in user_ids:
+                    try:
+                        await _send_snapshot(db, uid, prices=prices, price_errors=price_errors, skip_unchanged=True)
+                    except Exception as e:
+                        logger.error(f"用户 {uid} 快照更新失败: {e}")
                 
                 # 保存持仓股票的当日最新价格
-                await self._save_position_prices(db, user_id)
+                await asyncio.to_thread(self._save_position_prices, db, prices)
                 
             finally:
                 db.close()
                 
         except Exception as e:
-            logger.error(f"用户 {user_id} 快照更新失败: {e}")
+            logger.error(f"快照广播失败: {e}")
     
-    async def _save_position_prices(self, db: Session, user_id: int):
+    def _save_position_prices(self, db: Session, prices: Dict):
         """
-        保存用户持仓股票的当日最新价格
+        保存持仓股票的当日最新价格（使用本轮广播已获取的价格）
         
         Args:
             db: 数据库会话
-            user_id: 用户ID
+            prices: {(symbol, market): price}
         """
+        if not prices:
+            logger.debug("没有持仓价格，跳过价格保存")
+            return
+        
         try:
-            # 获取用户的所有持仓
-            positions = db.query(Position).filter(
-                Position.user_id == user_id,
-                Position.quantity > 0
-            ).all()
+            today = date.today()
             
-            if not positions:
-                logger.debug(f"用户 {user_id} 没有持仓，跳过价格保存")
+            # 一次查询今日已保存价格的股票
+            existing = set(
+                db.query(StockPrice.symbol, StockPrice.market).filter(
+                    StockPrice.symbol.in_({symbol for symbol, _ in prices}),
+                    StockPrice.price_date == today
+                ).all()
+            )
+            
+            new_prices = [
+                (symbol, market, price)
+                for (symbol, market), price in prices.items()
+                if (symbol, market) not in existing
+            ]
+            if not new_prices:
                 return
             
-            today = date.today()
+            db.add_all(
+                StockPrice(symbol=symbol, market=market, price=price, price_date=today)
+                for symbol, market, price in new_prices
+            )
+            db.commit()
             
-            for position in positions:
-                try:
-                    # 检查今日是否已保存该股票价格
-                    existing_price = db.query(StockPrice).filter(
-                        StockPrice.symbol == position.symbol,
-                        StockPrice.market == position.market,
-                        StockPrice.price_date == today
-                    ).first()
-                    
-                    if existing_price:
-                        logger.debug(f"股票 {position.symbol} 今日价格已存在，跳过")
-                        continue
-                    
-                    # 获取最新价格
-                    from services.market_data import get_last_price
-                    current_price = get_last_price(position.symbol, position.market)
-                    
-                    # 保存价格记录
-                    stock_price = StockPrice(
-                        symbol=position.symbol,
-                        market=position.market,
-                        price=current_price,
-                        price_date=today
-                    )
-                    
-                    db.add(stock_price)
-                    db.commit()
-                    
-                    logger.info(f"已保存股票价格: {position.symbol} {today} {current_price}")
-                    
-                except Exception as e:
-                    logger.error(f"保存股票 {position.symbol} 价格失败: {e}")
-                    db.rollback()
-                    continue
+            for symbol, _, price in new_prices:
+                logger.info(f"已保存股票价格: {symbol} {today} {price}")
                     
         except Exception as e:
-            logger.error(f"保存用户 {user_id} 持仓价格失败: {e}")
+            logger.error(f"保存持仓价格失败: {e}")
             db.rollback()
 
 
@@ -276,14 +260,24 @@ def stop_scheduler():
     task_scheduler.shutdown()
 
 
-def add_user_snapshot_job(user_id: int, interval_seconds: int = 10):
-    """为用户添加快照任务的便捷函数"""
-    task_scheduler.add_user_snapshot_task(user_id, interval_seconds)
+def add_snapshot_broadcast_job(interval_seconds: int = 10):
+    """添加全局快照广播任务的便捷函数（已存在时不重复添加）"""
+    task_scheduler.add_snapshot_broadcast_task(interval_seconds)
+
+
+def remove_snapshot_broadcast_job():
+    """移除全局快照广播任务的便捷函数"""
+    task_scheduler.remove_snapshot_broadcast_task()
 
 
-def remove_user_snapshot_job(user_id: int):
-    """移除用户快照任务的便捷函数"""
-    task_scheduler.remove_user_snapshot_task(user_id)
+def add_daily_asset_snapshot_job():
+    """
+    添加资产曲线快照物化任务
+    成交日期按 UTC、价格日期按本机日期，两者的"今天"结束时间不同，因此每小时执行一次，
+    每次只计算最后一个快照之后的日期
+    """
+    from services.asset_curve import run_daily_snapshot_job
+    task_scheduler.add_market_hours_task(run_daily_snapshot_job, "5 * * * *", DAILY_ASSET_SNAPSHOT_JOB_ID)
 
 
 # 市场时间相关的预定义任务
@@ -33,15 +33,18 @@ def initialize_services():
 def initialize_xueqiu_config():
     """从数据库初始化雪球cookie配置"""
     try:
+        from sqlalchemy import select
         from database.connection import SessionLocal
         from database.models import SystemConfig
         from services.xueqiu_market_data import update_xueqiu_cookie
         
         db = SessionLocal()
         try:
-            config = db.query(SystemConfig).filter(SystemConfig.key == "xueqiu_cookie").first()
-            if config and config.value and config.value.strip():
-                update_xueqiu_cookie(config.value)
+            value = db.execute(
+                select(SystemConfig.value).where(SystemConfig.key == "xueqiu_cookie")
+            ).scalar_one_or_none()
+            if value and value.strip():
+                update_xueqiu_cookie(value)
                 logger.info("雪球cookie配置已从数据库加载")
             else:
                 logger.info("数据库中未找到雪球cookie配置")
@@ -3,7 +3,10 @@
 提供从雪球获取实时股票行情数据的功能
 """
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 from typing import Dict, List, Optional, Any
 from datetime import datetime
@@ -20,6 +23,20 @@ class XueqiuMarketData:
     
     def __init__(self):
         self.session = requests.Session()
+        # 复用到 stock.xueqiu.com 的长连接，并对连接错误和网关错误做有限重试
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=50,
+            max_retries=Retry(
+                total=2,
+                backoff_factor=0.3,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=("GET",),
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self._setup_session()
     
     def _setup_session(self):
@@ -155,7 +172,7 @@ class XueqiuMarketData:
                 logger.error(f"HTTP错误 {response.status_code}: {response.text[:200]}")
                 return None
                 
-            data = response.json()
+            data = orjson.loads(response.content)
             
             # 更详细的错误检查
             if data.get('error_code') == 0 or 'data' in data:
@@ -202,7 +219,7 @@ class XueqiuMarketData:
             response = self.session.get(url, params=params, timeout=10)
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             if 'data' in data and 'quote' in data['data']:
                 current_price = data['data']['quote'].get('current')
                 if current_price and float(current_price) > 0:
@@ -242,6 +259,33 @@ class XueqiuMarketData:
         logger.error(f"无法从 {symbol} 数据中提取有效价格")
         return None
     
+    def get_latest_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        一次请求批量获取多个股票的最新价格
+        
+        Args:
+            symbols: 股票Symbol列表
+            
+        Returns:
+            {symbol: 最新价格}，请求失败或无有效价格的股票不在结果中
+        """
+        prices: Dict[str, float] = {}
+        if not symbols:
+            return prices
+        try:
+            url = 'https://stock.xueqiu.com/v5/stock/realtime/quotec.json'
+            response = self.session.get(url, params={'symbol': ','.join(symbols)}, timeout=10)
+            response.raise_for_status()
+            
+            for quote in orjson.loads(response.content).get('data') or []:
+                current_price = quote.get('current')
+                if quote.get('symbol') and current_price and float(current_price) > 0:
+                    prices[quote['symbol']] = float(current_price)
+            logger.info(f"从雪球批量行情API获取 {len(prices)}/{len(symbols)} 个股票价格")
+        except Exception as e:
+            logger.warning(f"雪球批量行情API获取价格失败: {e}")
+        return prices
+    
     def parse_kline_data(self, raw_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         解析K线数据为标准格式
@@ -1,8 +1,28 @@
 import requests
 import json
 import re
+import orjson
 from typing import Dict, List
 
+# 股票Symbol：括号内以.US结尾，例如 (AMD.US)
+_STOCK_CODE_RE = re.compile(r'\(([A-Z]+\.US)\)')
+
+# 百分数字匹配，捕获潜在符号 + / - 以及数值
+_PERCENT_RE = re.compile(r"([+\-\u2212\uFF0B\uFF0D]?)\s*(\d+(?:\.\d+)?)\s*%")
+_NEGATIVE_SIGNS = frozenset(['-', '\u2212', '\uFF0D'])
+
+# 全文下跌语义词，用于排除（均为小写，匹配时对小写后的全文查找）
+_NEGATIVE_MARKERS = (
+    '跌', '下跌', '跌幅', '下滑', '下降', '回落', '走低', '暴跌', '大跌', '回撤',
+    'fall', 'falls', 'falling', 'fell', 'down', 'decline', 'declines',
+    'declined', 'decrease', 'decreased', 'drop', 'drops', 'dropped', 'lower'
+)
+
+_US_STOCK_NEWS_PREFIXES = (
+    '美股异动 |',
+    'US Stock Market Move |',
+)
+
 
 def is_success_status(status: object) -> bool:
     """
@@ -72,7 +92,7 @@ def get_stock_news(page: int = 1, news_type: str = 'meigu') -> Dict:
     try:
         response = requests.get(url, params=params, headers=headers, timeout=30)
         response.raise_for_status()
-        result = response.json()
+        result = orjson.loads(response.content)
         print(f"成功获取新闻数据，状态: {result.get('status')}")
         return result
     except requests.exceptions.Timeout as e:
@@ -134,7 +154,7 @@ def get_gmteight_news(
     try:
         response = requests.get(url, params=params, headers=headers, timeout=30)
         response.raise_for_status()
-        result = response.json()
+        result = orjson.loads(response.content)
         print(f"成功获取GMT Eight新闻数据，状态: {result.get('status')}")
         return result
     except requests.exceptions.Timeout as e:
@@ -161,9 +181,7 @@ def extract_stock_codes(text: str) -> List[str]:
     返回:
         提取到的股票Symbol列表，例如['AMD.US', 'NVDA.US']
     """
-    pattern = r'\(([A-Z]+\.US)\)'
-    matches = re.findall(pattern, text)
-    return matches
+    return _STOCK_CODE_RE.findall(text)
 
 
 def _contains_significant_increase(text: str) -> bool:
@@ -177,20 +195,10 @@ def _contains_significant_increase(text: str) -> bool:
         return False
 
     s = text
-    # 百分数字匹配，捕获潜在符号 + / - 以及数值
-    percent_re = re.compile(r"([+\-\u2212\uFF0B\uFF0D]?)\s*(\d+(?:\.\d+)?)\s*%")
-
-    # 全文下跌语义词，用于排除
-    negative_markers = [
-        '跌', '下跌', '跌幅', '下滑', '下降', '回落', '走低', '暴跌', '大跌', '回撤',
-        'fall', 'falls', 'falling', 'fell', 'down', 'decline', 'declines',
-        'declined', 'decrease', 'decreased', 'drop', 'drops', 'dropped', 'lower'
-    ]
-
     s_lower = s.lower()
-    has_global_negative = any(tok in s for tok in negative_markers) or any(tok in s_lower for tok in negative_markers)
+    has_global_negative = any(tok in s_lower for tok in _NEGATIVE_MARKERS)
 
-    for m in percent_re.finditer(s):
+    for m in _PERCENT_RE.finditer(s):
         sign = m.group(1)
         try:
             val = float(m.group(2))
@@ -200,7 +208,7 @@ def _contains_significant_increase(text: str) -> bool:
             continue
 
         # 明确负号 => 下跌，排除
-        if sign in ['-', '\u2212', '\uFF0D']:
+        if sign in _NEGATIVE_SIGNS:
             continue
 
         # 全文出现明显下跌语义 => 作为下跌排除（宁可漏掉下跌，不漏上涨）
@@ -224,15 +232,10 @@ def filter_us_stock_news(news_list: List[Dict]) -> List[Dict]:
         过滤后的新闻列表，包含提取的股票Symbol
     """
     filtered_news = []
-    
-    prefixes = (
-        '美股异动 |',
-        'US Stock Market Move |',
-    )
 
     for news in news_list:
         title = news.get('title', '')
-        if any(title.startswith(prefix) for prefix in prefixes):
+        if title.startswith(_US_STOCK_NEWS_PREFIXES):
             # 从标题中提取股票Symbol
             stock_codes = extract_stock_codes(title)
             
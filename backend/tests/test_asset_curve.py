@@ -0,0 +1,98 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from database.models import Order, StockPrice, Trade, UserDailySnapshot
+from services import asset_curve
+
+_FIRST_DAY = date.today() - timedelta(days=10)
+
+
+def _trade(db, user_id, day, order_no):
+    order = Order(
+        user_id=user_id, order_no=order_no, symbol="AAPL", name="Apple", market="US",
+        side="BUY", order_type="MARKET", quantity=1, filled_quantity=1, status="FILLED",
+    )
+    db.add(order)
+    db.flush()
+    db.add(Trade(
+        order_id=order.id, user_id=user_id, symbol="AAPL", name="Apple", market="US", side="BUY",
+        price=Decimal("100"), quantity=1, commission=Decimal("1"),
+        trade_time=datetime.combine(day, datetime.min.time()),
+    ))
+    db.commit()
+
+
+@pytest.fixture
+def user_id(db, user):
+    db.add_all(
+        StockPrice(symbol="AAPL", market="US", price=100 + i, price_date=_FIRST_DAY + timedelta(days=i))
+        for i in range(11)
+    )
+    db.commit()
+    _trade(db, user.id, _FIRST_DAY, "ORD1")
+    return user.id
+
+
+def _snapshot_dates(db, user_id):
+    rows = db.query(UserDailySnapshot.snapshot_date).filter(UserDailySnapshot.user_id == user_id)
+    return sorted(d for (d,) in rows)
+
+
+def test_load_asset_curve_does_not_write(db, user_id):
+    first_day, points = asset_curve.load_asset_curve(db, user_id, 100000.0)
+    assert first_day == _FIRST_DAY
+    assert points[-1]["date"] == date.today().isoformat()
+    assert _snapshot_dates(db, user_id) == []
+
+
+def test_materialize_stores_only_finished_days(db, user_id):
+    expected = asset_curve.load_asset_curve(db, user_id, 100000.0)
+    assert asset_curve.materialize_daily_snapshots(db) == 10
+    dates = _snapshot_dates(db, user_id)
+    assert dates[0] == _FIRST_DAY and dates[-1] < asset_curve.snapshot_cutoff_date()
+    assert asset_curve.load_asset_curve(db, user_id, 100000.0) == expected
+    assert asset_curve.materialize_daily_snapshots(db) == 0
+
+
+def test_past_trade_invalidates_later_snapshots(db, user_id):
+    asset_curve.materialize_daily_snapshots(db)
+    _trade(db, user_id, _FIRST_DAY + timedelta(days=5), "ORD2")
+    assert _snapshot_dates(db, user_id)[-1] == _FIRST_DAY + timedelta(days=4)
+
+    asset_curve.materialize_daily_snapshots(db)
+    first_day, points = asset_curve.load_asset_curve(db, user_id, 100000.0)
+    assert points[-1]["positions_value"] == 2 * 110
+
+
+def test_backfilled_price_invalidates_later_snapshots(db, user_id):
+    asset_curve.materialize_daily_snapshots(db)
+    db.add(StockPrice(symbol="MSFT", market="US", price=300, price_date=_FIRST_DAY + timedelta(days=3)))
+    db.commit()
+    assert _snapshot_dates(db, user_id)[-1] == _FIRST_DAY + timedelta(days=2)
+
+
+def test_corrected_price_invalidates_from_its_date(db, user_id):
+    asset_curve.materialize_daily_snapshots(db)
+    price = db.query(StockPrice).filter(StockPrice.price_date == _FIRST_DAY + timedelta(days=6)).one()
+    price.price = 500
+    db.commit()
+    assert _snapshot_dates(db, user_id)[-1] == _FIRST_DAY + timedelta(days=5)
+
+
+def test_materialize_skips_write_when_data_changes_meanwhile(db, session_factory, user_id, monkeypatch):
+    compute = asset_curve._compute_curve
+
+    def compute_then_backfill(session, uid, initial_capital):
+        result = compute(session, uid, initial_capital)
+        # A price is backfilled after the curve was computed but before its snapshots are written
+        writer = session_factory()
+        writer.add(StockPrice(symbol="AAPL", market="US", price=1, price_date=_FIRST_DAY - timedelta(days=1)))
+        writer.commit()
+        writer.close()
+        return result
+
+    monkeypatch.setattr(asset_curve, "_compute_curve", compute_then_backfill)
+    assert asset_curve.materialize_daily_snapshots(db) == 0
+    assert _snapshot_dates(db, user_id) == []
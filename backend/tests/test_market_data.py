@@ -0,0 +1,46 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from services import market_data
+from services.cache import closed_market_price_cache, price_cache
+
+_ET = ZoneInfo("America/New_York")
+
+
+@pytest.fixture(autouse=True)
+def clear_price_caches():
+    price_cache.clear()
+    closed_market_price_cache.clear()
+    yield
+    price_cache.clear()
+    closed_market_price_cache.clear()
+
+
+@pytest.mark.parametrize(
+    "now, ttl",
+    [
+        (datetime(2026, 10, 14, 10, 0, tzinfo=_ET), None),
+        (datetime(2026, 10, 14, 3, 59, tzinfo=_ET), 60),
+        (datetime(2026, 10, 14, 21, 0, tzinfo=_ET), 600),
+        (datetime(2026, 10, 19, 3, 55, tzinfo=_ET), 300),
+    ],
+)
+def test_closed_market_ttl_ends_at_session_start(now, ttl):
+    assert market_data._closed_market_price_ttl(now) == ttl
+
+
+def test_closed_market_prices_not_used_by_get_last_price(monkeypatch):
+    quotes = iter([100.0, 101.0])
+    monkeypatch.setattr(market_data, "_check_xueqiu_cookie_available", lambda: False)
+    monkeypatch.setattr(market_data, "_fetch_last_price", lambda symbol, market: next(quotes))
+    monkeypatch.setattr(market_data, "_closed_market_price_ttl", lambda now=None: 600)
+
+    key = ("AAPL", "US")
+    assert market_data.get_last_prices([key]) == ({key: 100.0}, {})
+    # Snapshots keep reading the closed-market price after the short cache expires
+    price_cache.clear()
+    assert market_data.get_last_prices([key]) == ({key: 100.0}, {})
+    # Order matching always fetches through the short-lived cache
+    assert market_data.get_last_price(*key) == 101.0
@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from database.models import Order, Position, Trade
+from repositories.order_repo import list_orders
+from repositories.position_repo import list_positions
+
+
+@pytest.fixture
+def holdings(db, user):
+    position = Position(
+        user_id=user.id, symbol="AAPL", name="Apple", market="US",
+        quantity=10, available_quantity=10, avg_cost=Decimal("150"),
+    )
+    order = Order(
+        user_id=user.id, order_no="ORD1", symbol="AAPL", name="Apple", market="US",
+        side="BUY", order_type="MARKET", quantity=10, filled_quantity=10, status="FILLED",
+    )
+    db.add_all([position, order])
+    db.flush()
+    db.add(Trade(
+        order_id=order.id, user_id=user.id, symbol="AAPL", name="Apple", market="US",
+        side="BUY", price=Decimal("150"), quantity=10, commission=Decimal("1"),
+    ))
+    db.commit()
+    user_id = user.id
+    # Start from an empty identity map so no relationship is already loaded
+    db.expunge_all()
+    return user_id
+
+
+def test_list_positions_forbids_lazy_relationships(db, holdings):
+    positions = list_positions(db, holdings)
+    assert [p.symbol for p in positions] == ["AAPL"]
+    with pytest.raises(InvalidRequestError):
+        positions[0].user
+
+
+def test_list_orders_forbids_lazy_relationships(db, holdings):
+    orders = list_orders(db, holdings)
+    assert [o.order_no for o in orders] == ["ORD1"]
+    with pytest.raises(InvalidRequestError):
+        orders[0].trades
+    with pytest.raises(InvalidRequestError):
+        orders[0].user
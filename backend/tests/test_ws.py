@@ -0,0 +1,59 @@
+import pytest
+
+from api import ws
+from database.models import Order
+from services.cache import recent_trades_cache, snapshot_rows_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_snapshot_caches():
+    snapshot_rows_cache.clear()
+    recent_trades_cache.clear()
+    yield
+    snapshot_rows_cache.clear()
+    recent_trades_cache.clear()
+
+
+def _add_order(db, user_id, order_no):
+    db.add(Order(
+        user_id=user_id, order_no=order_no, symbol="AAPL", name="Apple", market="US",
+        side="BUY", order_type="LIMIT", price=150, quantity=1, status="PENDING",
+    ))
+    db.commit()
+
+
+def test_snapshot_rows_cached_until_commit(db, session_factory, user):
+    user_id = user.id
+    account, positions, orders, trades = ws._snapshot_rows(db, user_id)
+    assert account["username"] == "alice" and orders == [] and trades == ()
+    assert snapshot_rows_cache.get(user_id) is not None
+
+    writer = session_factory()
+    _add_order(writer, user_id, "ORD1")
+    writer.close()
+
+    assert snapshot_rows_cache.get(user_id) is None
+    _, _, orders, _ = ws._snapshot_rows(db, user_id)
+    assert [o["order_no"] for o in orders] == ["ORD1"]
+
+
+def test_commit_between_read_and_set_is_not_cached(db, session_factory, user, monkeypatch):
+    user_id = user.id
+    read_orders = ws.list_order_rows
+
+    def list_orders_then_commit(session, uid):
+        rows = read_orders(session, uid)
+        # Another writer commits after the rows were read but before they are cached
+        writer = session_factory()
+        _add_order(writer, uid, "ORD1")
+        writer.close()
+        return rows
+
+    monkeypatch.setattr(ws, "list_order_rows", list_orders_then_commit)
+    _, _, orders, _ = ws._snapshot_rows(db, user_id)
+    assert orders == []
+    assert snapshot_rows_cache.get(user_id) is None
+
+    monkeypatch.setattr(ws, "list_order_rows", read_orders)
+    _, _, orders, _ = ws._snapshot_rows(db, user_id)
+    assert [o["order_no"] for o in orders] == ["ORD1"]